@@ -5,11 +5,29 @@ from pathlib import Path
 root_dir = str(Path(__file__).parent.parent)
 sys.path.append(root_dir)
 
-from basic.LLM_interface import KIMI, DeepSeek_R1
+from basic.LLM_Interface import KIMI, DeepSeek_R1
 from basic.circuit_model import *
+from basic.markdown_index import parse_markdown
+from basic.prompt_template import get_template
+from basic.token_budget import fit_prompt
+from basic.trace import span, traced
 import os
 
-all_models = load_all_models()
+# loaded on first use through get_all_models(), netlists and test code are
+# only read from the model store when a model actually needs them
+_all_models = None
+
+def get_all_models() -> dict:
+    global _all_models
+    if _all_models is None:
+        from basic.model_store import get_model_store
+        _all_models = get_model_store().load_all()
+    return _all_models
+
+def __getattr__(name: str):
+    if name == 'all_models':
+        return get_all_models()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 prompt_paths = {
     'Generate_Circuit' : './prompts/circuit_generate.md',
@@ -21,28 +39,63 @@ prompt_paths = {
 
 LLM_model = DeepSeek_R1
 
-def generate_prompt(file_path: str, replacement: dict) -> str:
-    try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        for key, value in replacement.items():
-            if value != None:
-                placeholder = f"[{key}]"
-                content = content.replace(placeholder, value)
-        return content
-    except Exception as e:
-        print(f"Error: {e}") 
-        raise
+# racing mode: every stage prompt goes to the race_size fastest of these at
+# once and the first answer that passes the stage check wins, e.g.
+# racing_providers = [DeepSeek_R1, KIMI]
+racing_providers = None
+race_size = 2
+
+# generated netlists with lint errors are sent back this many times
+lint_repair_rounds = 1
+
+# upper bound on LLM requests in flight when generating submodules concurrently
+max_concurrency = 4
+
+# prompt token budget per stage, capped by what the model's context window leaves
+# after the expected completion; larger prompts are compacted to fit
+stage_token_budgets = {
+    'Generate_Circuit' : 4000,
+    'Check_Promblems' : 6000,
+    'Requirement_Parsing' : 3000,
+    'Submodule_Connect' : 6000
+}
+
+# (template, keys) pairs already reported as unused, get_replacement() passes every
+# model field so the same keys come back on each call
+_reported_unused = set()
+
+def generate_stage_prompt(stage: str, replacement: dict, suffix: str = '') -> str:
+    with span('generate_prompt', stage=stage) as current:
+        template = get_template(prompt_paths[stage])
+        missing = template.missing(replacement)
+        if missing:
+            print(f"Warning: {prompt_paths[stage]} has no value for {', '.join(sorted(missing))}")
+        unused = tuple(sorted(template.unused(replacement)))
+        if unused and (prompt_paths[stage], unused) not in _reported_unused:
+            _reported_unused.add((prompt_paths[stage], unused))
+            print(f"Warning: {prompt_paths[stage]} does not use {', '.join(unused)}")
+
+        # the prompt has to fit every provider that may receive it, so it is sized
+        # and counted for the one with the smallest context window
+        smallest = min(racing_providers or [LLM_model], key=lambda provider: provider.prompt_budget())
+        budget = smallest.prompt_budget()
+        if stage_token_budgets.get(stage) is not None:
+            budget = min(budget, stage_token_budgets[stage])
+        prompt, tokens, applied = fit_prompt(template, replacement, smallest.get_counter(), budget, suffix)
+        current.set(prompt_tokens_estimate=tokens, compaction=applied)
+        if applied:
+            print(f"{stage}: prompt compacted to {tokens} tokens ({', '.join(applied)})")
+        return prompt
    
-# def add_submodule(message: str, module_list: list[SUBMODEL]):
-#     for i in range(len(module_list)):
-#         message += f"\n\n##SubModel {i+1}\n"
-#         message += f"Model: {module_list[i].model}"
-#         message += f"Description: {module_list[i].description}"
-#         message += f"Input Nodes: {module_list[i].inputnode}"
-#         message += f"Output Nodes: {module_list[i].outputnode}"
-#         message += f"Parameters: {module_list[i].parameter}"
-#     return message
+def add_submodules(message: str, module_list: list[CIRCUIT_MODEL]) -> str:
+    for i, module in enumerate(module_list):
+        message += f"\n### SubModel {i+1}\n\n"
+        message += f"Model: {module.model_name}\n"
+        message += f"Description: {module.model_description}\n"
+        message += f"Input Nodes: {module.inputnode}\n"
+        message += f"Output Nodes: {module.outputnode}\n"
+        message += f"Parameters: \n{module.parameter_description or ''}\n"
+    return message
 
 
 
@@ -54,53 +107,23 @@ def generate_prompt(file_path: str, replacement: dict) -> str:
     
 #     return code_blocks
 
-def extract_code(text: str, segment_leader: str, code_leader: str):
-    pattern = re.compile(
-        r'###\s+' + re.escape(segment_leader) + r'\s*' + 
-        r'```' + re.escape(code_leader) + r'\n(.*?)```',
-        re.DOTALL
-    )
-    match = pattern.search(text)
-    if match:
-        return match.group(1).strip()
-    return None
+@traced('extract_code')
+def extract_code(text: str, segment_leader: str, code_leader: str, min_level: int = 3):
+    return parse_markdown(text).code_block(segment_leader, code_leader, min_level)
 
+@traced('extract_test_items')
 def extract_test_items(text: str):
-    pattern = r'####\s+(Test_Item\s+\d+)(.*?)(?=#### Test_Item|\Z)'
-    matches = re.finditer(pattern, text, re.DOTALL)
-    
     test_items = []
-    test_descriptions = []    
-    for match in matches:
-        item_name = match.group(1).strip()
-        item_content = match.group(2).strip()
-
-        markdown_match = re.search(r'```markdown\n(.*?)```', item_content, re.DOTALL)
-        markdown = markdown_match.group(1).strip() if markdown_match else None
-
-        python_match = re.search(r'```python\n(.*?)```', item_content, re.DOTALL)
-        python_code = python_match.group(1).strip() if python_match else None
-        
+    test_descriptions = []
+    for python_code, markdown in parse_markdown(text).test_items():
         test_items.append(python_code)
         test_descriptions.append(markdown)
-    
     return test_items, test_descriptions
 
+@traced('extract_submodels')
 def extract_submodels(message: str) -> list[CIRCUIT_MODEL]:
-    pattern = re.compile(
-        r'####\s+Module\s+\d+\s*\n'
-        r'Model:\s*(.*?)\s*\n'
-        r'Description:\s*(.*?)\s*\n'
-        r'Input\s+Nodes:\s*(.*?)\s*\n'
-        r'Output\s+Nodes:\s*(.*?)\s*(?=\n##|$)',
-        re.DOTALL | re.IGNORECASE
-    )
     submodels = []
-    for m in pattern.finditer(message):
-        model       = m.group(1).strip()
-        description = m.group(2).strip()
-        inputnode   = m.group(3).strip()
-        outputnode  = m.group(4).strip()
+    for model, description, inputnode, outputnode in parse_markdown(message).module_blocks():
         submodels.append(
             CIRCUIT_MODEL(
                 model_name=model,
@@ -111,6 +134,35 @@ def extract_submodels(message: str) -> list[CIRCUIT_MODEL]:
         )
     return submodels
 
+class MODULE_STREAM_PARSER:
+    # a "#### Module N" block is complete as soon as the next heading starts
+    heading_pattern = re.compile(r'^##', re.MULTILINE)
+
+    def __init__(self):
+        self.buffer = ''
+        self.block_start = 0
+        self.scan_from = 1
+
+    def feed(self, chunk: str) -> list[CIRCUIT_MODEL]:
+        self.buffer += chunk
+        submodels = []
+        while True:
+            match = self.heading_pattern.search(self.buffer, self.scan_from)
+            if match is None:
+                # a heading may be split across chunks, rescan its first bytes next time
+                self.scan_from = max(self.block_start + 1, len(self.buffer) - 2)
+                break
+            submodels.extend(extract_submodels(self.buffer[self.block_start:match.start()]))
+            self.block_start = match.start()
+            self.scan_from = match.start() + 1
+        return submodels
+
+    def close(self) -> list[CIRCUIT_MODEL]:
+        submodels = extract_submodels(self.buffer[self.block_start:])
+        self.block_start = len(self.buffer)
+        self.scan_from = len(self.buffer) + 1
+        return submodels
+
 
 # def run_python_file(file_path):
 #     result = subprocess.run(
@@ -129,43 +181,93 @@ def extract_submodels(message: str) -> list[CIRCUIT_MODEL]:
 
 
 
-# def connect_submodules(topmodule: SUBMODEL, submodule_list: list[SUBMODEL]):
-#     prompt = generate_prompt(prompt_paths['Submodule_Connect'], topmodule.get_replacement())
-#     prompt = add_submodule(prompt, submodule_list)
-#     print(f"Get top circuit generation prompt:\n{prompt}")
+# what an answer must contain for its stage to use it
+stage_checks = {
+    'Generate_Circuit' : lambda response: extract_code(response, "NetList Code", 'python') is not None,
+    'Check_Promblems' : lambda response: len(extract_test_items(response)[0]) > 0,
+    'Requirement_Parsing' : lambda response: len(extract_submodels(response)) > 0,
+    # prompts/submodule_connect.md asks for a "## Topology" section
+    'Submodule_Connect' : lambda response: extract_code(response, "Topology", 'python', min_level=2) is not None
+}
+
+def get_stage_answer(prompt: str, stage: str) -> tuple:
+    # (response, provider that gave it)
+    if not racing_providers:
+        return LLM_model.get_answer(prompt, stage=stage), LLM_model
+    from basic.provider_race import race
+
+    return race(racing_providers, prompt, stage_checks[stage], stage, race_size)
+
+
+def create_connect_submodules(topmodel: CIRCUIT_MODEL):
+    all_models = get_all_models()
+    submodels = [all_models[name] for name in topmodel.submodel_names]
+    prompt = generate_stage_prompt('Submodule_Connect', topmodel.get_replacement(), add_submodules('', submodels))
+    print(f"\n\n{prompt}")
+
+    response, provider = get_stage_answer(prompt, 'Submodule_Connect')
+    print(f"## Get response from {provider.name}\n\n{response}")
+
+    topmodel.netlist = extract_code(response, "Topology", 'python', min_level=2)
+
+
+# outputs of the generation stages, kept when a submodule is parsed again
+generated_fields = ('parameter_description', 'netlist', 'testcode', 'testDescription', 'submodel_names')
 
-#     response = LLM_model.get_answer(prompt)
-#     print(f"Get response from {LLM_model.name}:\n{response}")
+def register_submodel(model: CIRCUIT_MODEL):
+    all_models = get_all_models()
+    previous = all_models.get(model.model_name)
+    if previous is not None:
+        for field in generated_fields:
+            if getattr(model, field) is None:
+                setattr(model, field, getattr(previous, field))
+    all_models[model.model_name] = model
 
 
 def create_sub_circuit(model: CIRCUIT_MODEL):
-    prompt = generate_prompt(prompt_paths['Generate_Circuit'], model.get_replacement())
+    prompt = generate_stage_prompt('Generate_Circuit', model.get_replacement())
     print(f"\n\n{prompt}")
 
-    response = LLM_model.get_answer(prompt)
-    print(f"## Get Response from {LLM_model.name}\n\n{response}")
+    response, provider = get_stage_answer(prompt, 'Generate_Circuit')
+    print(f"## Get Response from {provider.name}\n\n{response}")
 
     model.netlist = extract_code(response, "NetList Code", 'python')
     model.parameter_description = extract_code(response, "Parameter Explanation", 'markdown')
 
+    # structural mistakes go back to the LLM before anything gets simulated
+    from basic.netlist_lint import lint_code_isolated, has_errors, format_issues
+    for _ in range(lint_repair_rounds):
+        if not model.netlist:
+            break
+        issues = lint_code_isolated(model.netlist)
+        if not has_errors(issues):
+            break
+        print(f"## Lint errors in {model.model_name}\n\n{format_issues(issues)}")
+        repair_prompt = (f"{prompt}\n\nYour previous answer:\n\n{response}\n\n"
+                         f"The NetList Code has these problems:\n{format_issues(issues)}\n\n"
+                         "Please answer again in the same format with these problems fixed.")
+        response, provider = get_stage_answer(repair_prompt, 'Generate_Circuit')
+        print(f"## Get Response from {provider.name}\n\n{response}")
+        model.netlist = extract_code(response, "NetList Code", 'python') or model.netlist
+        model.parameter_description = extract_code(response, "Parameter Explanation", 'markdown') or model.parameter_description
 
 
 def create_check_problems(model: CIRCUIT_MODEL):
-    prompt = generate_prompt(prompt_paths['Check_Promblems'], model.get_replacement())
+    prompt = generate_stage_prompt('Check_Promblems', model.get_replacement())
     print(f"\n\n{prompt}")
 
-    response = LLM_model.get_answer(prompt)
-    print(f"## Get response from {LLM_model.name} \n\n{response}")
+    response, provider = get_stage_answer(prompt, 'Check_Promblems')
+    print(f"## Get response from {provider.name} \n\n{response}")
     
     model.testcode, model.testDescription = extract_test_items(response)
 
 
 def create_requirement_parsing(topmodel: CIRCUIT_MODEL):
-    prompt = generate_prompt(prompt_paths['Requirement_Parsing'], topmodel.get_replacement())
+    prompt = generate_stage_prompt('Requirement_Parsing', topmodel.get_replacement())
     print(f"\n\n{prompt}")
 
-    response = LLM_model.get_answer(prompt)
-    print(f"## Get response from {LLM_model.name}\n\n{response}")
+    response, provider = get_stage_answer(prompt, 'Requirement_Parsing')
+    print(f"## Get response from {provider.name}\n\n{response}")
 
     submodel = extract_submodels(response)
 
@@ -173,10 +275,193 @@ def create_requirement_parsing(topmodel: CIRCUIT_MODEL):
     topmodel.submodel_names = submodel_names
     
     for model in submodel:
-        all_models[model.model_name] = model
+        register_submodel(model)
+
+def create_requirement_parsing_streaming(topmodel: CIRCUIT_MODEL, generate: bool = True,
+                                         concurrency: int = None):
+    # dispatches create_sub_circuit for every module as soon as its block has
+    # been streamed, while the rest of the response is still arriving
+    from concurrent.futures import ThreadPoolExecutor
+    prompt = generate_stage_prompt('Requirement_Parsing', topmodel.get_replacement())
+    print(f"\n\n{prompt}")
 
-if __name__ == '__main__':
+    parser = MODULE_STREAM_PARSER()
+    submodels = []
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency or max_concurrency) as executor:
+        def dispatch(models: list[CIRCUIT_MODEL]):
+            for model in models:
+                register_submodel(model)
+                submodels.append(model)
+                if generate:
+                    futures.append(executor.submit(create_sub_circuit, model))
+
+        for chunk in LLM_model.get_answer_stream(prompt, stage='Requirement_Parsing'):
+            dispatch(parser.feed(chunk))
+        dispatch(parser.close())
+        print(f"## Get response from {LLM_model.name}\n\n{parser.buffer}")
+
+        topmodel.submodel_names = [ model.model_name for model in submodels ]
+
+        failed = {}
+        for model, future in zip(submodels, futures):
+            error = future.exception()
+            if error is not None:
+                print(f"Failed to generate {model.model_name}: {error}")
+                failed[model.model_name] = error
+    return failed
+
+incremental_stages = {
+    'Requirement_Parsing': create_requirement_parsing,
+    'Generate_Circuit': create_sub_circuit,
+    'Check_Promblems': create_check_problems,
+}
+
+def run_stage(stage: str, model: CIRCUIT_MODEL, force: bool = False) -> bool:
+    # runs the stage only when the fingerprint of its inputs differs from the
+    # one recorded after its last successful run
+    from basic.fingerprint import stage_fingerprint
+    from basic.model_store import get_model_store
+
+    store = get_model_store()
+    fingerprint = stage_fingerprint(model, prompt_paths[stage], LLM_model, racing_providers)
+    if not force and store.get_fingerprint(model.model_name, stage) == fingerprint:
+        print(f"{model.model_name}: {stage} is up to date")
+        return False
+
+    incremental_stages[stage](model)
+    # outputs are saved before the fingerprint so a crash leaves the stage stale
+    outputs = [model]
+    if stage == 'Requirement_Parsing':
+        all_models = get_all_models()
+        outputs += [all_models[name] for name in model.submodel_names]
+    store.save_many(outputs)
+    store.set_fingerprint(model.model_name, stage, fingerprint)
+    return True
+
+def regenerate(topmodel: CIRCUIT_MODEL, force: bool = False) -> list[str]:
+    # like a build system: stale stages are redone, and because every stage
+    # output feeds the next fingerprint, their dependents follow automatically
+    all_models = get_all_models()
+    rebuilt = []
+    if run_stage('Requirement_Parsing', topmodel, force):
+        rebuilt.append(f"{topmodel.model_name}:Requirement_Parsing")
+
+    for name in topmodel.submodel_names or []:
+        model = all_models[name]
+        if model.submodel_names:
+            rebuilt += regenerate(model, force)
+            continue
+        for stage in ('Generate_Circuit', 'Check_Promblems'):
+            if run_stage(stage, model, force):
+                rebuilt.append(f"{name}:{stage}")
+    return rebuilt
+
+def build_generation_dag(scheduler, model: CIRCUIT_MODEL, depth: int = 0, max_depth: int = 1,
+                         run_tests: bool = False) -> str:
+    # adds parse -> (children) -> build -> test tasks for model and returns the
+    # name of its last task; build connects the submodules of a composite model
+    # and generates the netlist of a leaf
+    from basic.testbench_runner import run_model_tests
+
+    name = model.model_name
+    build_task = f"build:{name}"
+    test_task = f"test:{name}"
+    if test_task in scheduler.states:
+        return test_task
+
+    # an answer without the expected code fails its task, so the parents stay blocked
+    def build():
+        if model.submodel_names:
+            create_connect_submodules(model)
+        else:
+            create_sub_circuit(model)
+        if model.netlist is None:
+            raise RuntimeError(f"{name}: no netlist code found in the answer")
+
+    def test():
+        create_check_problems(model)
+        if not model.testcode:
+            raise RuntimeError(f"{name}: no test items found in the answer")
+        model.save_model()
+        if run_tests:
+            results = run_model_tests([model])
+            failed = [r.index for r in results if r.status != 'passed']
+            if failed:
+                raise RuntimeError(f"{name}: test items {failed} did not pass")
+            return results
+
+    def parse():
+        create_requirement_parsing(model)
+        model.save_model()
+        all_models = get_all_models()
+        for child_name in model.submodel_names:
+            child_task = build_generation_dag(scheduler, all_models[child_name], depth + 1, max_depth, run_tests)
+            scheduler.add_dependency(build_task, child_task)
+
+    if model.submodel_names:
+        all_models = get_all_models()
+        child_tasks = [build_generation_dag(scheduler, all_models[child], depth + 1, max_depth, run_tests)
+                       for child in model.submodel_names]
+        scheduler.add_task(build_task, build, child_tasks)
+    elif depth < max_depth:
+        # a parse that finds no submodules leaves the model a leaf
+        scheduler.add_task(f"parse:{name}", parse)
+        scheduler.add_task(build_task, build, [f"parse:{name}"])
+    else:
+        scheduler.add_task(build_task, build)
+    scheduler.add_task(test_task, test, [build_task])
+    return test_task
+
+def create_hierarchy(topmodel: CIRCUIT_MODEL, max_depth: int = 1, concurrency: int = None,
+                     run_tests: bool = False) -> dict:
+    from basic.scheduler import DAG_SCHEDULER
+
+    scheduler = DAG_SCHEDULER(concurrency or max_concurrency)
+    build_generation_dag(scheduler, topmodel, 0, max_depth, run_tests)
+    states = scheduler.run()
+    for task, error in scheduler.errors.items():
+        print(f"{task}: {error}")
+    return states
+
+async def _run_limited(semaphore: 'asyncio.Semaphore', stage, model: CIRCUIT_MODEL):
+    import asyncio
+
+    async with semaphore:
+        await asyncio.to_thread(stage, model)
+
+async def _generate_submodel(semaphore: 'asyncio.Semaphore', model: CIRCUIT_MODEL):
+    await _run_limited(semaphore, create_sub_circuit, model)
+    await _run_limited(semaphore, create_check_problems, model)
+    model.save_model()
+
+async def create_submodels_async(topmodel: CIRCUIT_MODEL, concurrency: int = None):
+    # each submodule runs its own generate -> check chain, so the hierarchy
+    # finishes roughly when its slowest submodule does
+    import asyncio
+
+    semaphore = asyncio.Semaphore(concurrency or max_concurrency)
+    all_models = get_all_models()
+    submodels = [all_models[name] for name in topmodel.submodel_names]
+    results = await asyncio.gather(
+        *(_generate_submodel(semaphore, model) for model in submodels),
+        return_exceptions=True
+    )
 
+    failed = {}
+    for model, result in zip(submodels, results):
+        if isinstance(result, Exception):
+            print(f"Failed to generate {model.model_name}: {result}")
+            failed[model.model_name] = result
+    return failed
+
+def create_submodels(topmodel: CIRCUIT_MODEL, concurrency: int = None):
+    import asyncio
+
+    return asyncio.run(create_submodels_async(topmodel, concurrency))
+
+if __name__ == '__main__':
+    all_models = get_all_models()
 
     # create_pyspice_module(OneStageAmplifer01)
 
@@ -192,6 +477,18 @@ if __name__ == '__main__':
 
     create_requirement_parsing(all_models['TwoStageDifferentialOpamp'])
 
-    all_models['TwoStageDifferentialOpamp'].save_model_json()
+    all_models['TwoStageDifferentialOpamp'].save_model()
+
+    # create_submodels(all_models['TwoStageDifferentialOpamp'])
+
+    # regenerate(all_models['TwoStageDifferentialOpamp'])
+
+    # create_hierarchy(all_models['ClockDataRecovery'])
+
+    # racing_providers = [DeepSeek_R1, KIMI]
+    # create_sub_circuit(all_models['PhaseDetector'])
+
+    # from basic.testbench_runner import run_model_tests
+    # results = run_model_tests([all_models[name] for name in all_models['TwoStageDifferentialOpamp'].submodel_names])
 
     # ClockDataRecovery.save_model_json()
@@ -1,33 +1,376 @@
-from openai import OpenAI
 import os
+import json
+import hashlib
+import time
+import threading
+from basic.rate_limit import PROVIDER_LIMITER, retry_after, backoff_delay
+from basic.token_budget import TOKEN_COUNTER, token_usage
+from basic.trace import tracer
 
-class KIMI:
+class LLM_CACHE:
+    def __init__(self, cache_dir: str = './llm_cache', max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # enabled=False bypasses the cache entirely, refresh=True skips lookups
+        # but still stores the fresh response
+        self.enabled = True
+        self.refresh = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(provider: str, model: str, temperature: float, prompt: str) -> str:
+        payload = json.dumps([provider, model, temperature, prompt], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                response = json.load(file)['response']
+            # the file mtime doubles as the LRU timestamp
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def put(self, key: str, response: str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'response': response}, file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            try:
+                scan = list(os.scandir(self.cache_dir))
+            except OSError:
+                return
+            for entry in scan:
+                if not entry.name.endswith('.json'):
+                    continue
+                # another process may have evicted or replaced it meanwhile
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.json'):
+                    os.remove(entry.path)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+response_cache = LLM_CACHE()
+
+def _cache_key(provider, request: str, use_cache: bool, refresh: bool):
+    # returns (key, cached response); key is None when the cache is bypassed
+    if not (use_cache and response_cache.enabled):
+        return None, None
+    if refresh is None:
+        refresh = response_cache.refresh
+
+    key = LLM_CACHE.make_key(provider.provider, provider.name, provider.temperature, request)
+    if refresh:
+        with response_cache._lock:
+            response_cache.misses += 1
+        return key, None
+    return key, response_cache.get(key)
+
+
+class RequestCancelled(RuntimeError):
+    pass
+
+
+class CANCEL_SCOPE:
+    # lets another thread stop a request: once cancelled, _create gives up before
+    # the next attempt or while waiting in the limiter or a retry backoff, and a
+    # stream that is already open is closed right away
+    def __init__(self):
+        self.event = threading.Event()
+        self._streams = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def attach(self, stream) -> bool:
+        with self._lock:
+            if self.event.is_set():
+                return False
+            self._streams.append(stream)
+            return True
+
+    def cancel(self):
+        with self._lock:
+            self.event.set()
+            streams, self._streams = self._streams, []
+        for stream in streams:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+# one keep-alive connection pool shared by every provider client
+http_pool_size = 32
+http_timeout = 600.0
+_http_client = None
+_http_client_ready = False
+_http_lock = threading.Lock()
+# (HTTP module, openai client class) pairs, the newer SDKs are built on httpx2
+http_backends = (('httpx2', 'DefaultHttpx2Client'), ('httpx', 'DefaultHttpxClient'))
+
+def get_http_client():
+    # None when the SDK ships neither backend, each provider client then keeps its own pool
+    global _http_client, _http_client_ready
+    if not _http_client_ready:
+        with _http_lock:
+            if not _http_client_ready:
+                import importlib
+                import openai
+                for module_name, client_name in http_backends:
+                    try:
+                        http = importlib.import_module(module_name)
+                    except ImportError:
+                        continue
+                    client_class = getattr(openai, client_name, None)
+                    if client_class is None:
+                        continue
+                    _http_client = client_class(
+                        limits = http.Limits(max_connections = http_pool_size,
+                                             max_keepalive_connections = http_pool_size),
+                        timeout = http.Timeout(http_timeout, connect = 10.0)
+                    )
+                    break
+                _http_client_ready = True
+    return _http_client
+
+
+class LLM_PROVIDER:
+    name = None
+    provider = None
+    base_url = None
+    key_env = None
+    temperature = 0.0
+    client = None
+    _client_lock = threading.Lock()
+
+    # client-side limits, set these to the account tier of each provider
+    requests_per_minute = 60
+    tokens_per_minute = 100000
+    expected_completion_tokens = 2048
+    max_retries = 6
+    limiter = None
+
+    # prompt plus completion, prompts are compacted to fit what is left of it
+    context_window = 8192
+    counter = None
+    # whether the streaming API reports usage in a final chunk
+    stream_usage = False
+
+    @classmethod
+    def get_client(cls):
+        # the client (and the openai import) is only built on first use
+        if cls.client is None:
+            with cls._client_lock:
+                if cls.client is None:
+                    from openai import OpenAI
+                    cls.client = OpenAI(api_key = os.getenv(cls.key_env), base_url = cls.base_url,
+                                        http_client = get_http_client(), max_retries = 0)
+        return cls.client
+
+    @classmethod
+    def get_limiter(cls) -> PROVIDER_LIMITER:
+        if cls.limiter is None:
+            with cls._client_lock:
+                if cls.limiter is None:
+                    cls.limiter = PROVIDER_LIMITER(cls.requests_per_minute, cls.tokens_per_minute)
+        return cls.limiter
+
+    @classmethod
+    def get_counter(cls) -> TOKEN_COUNTER:
+        if cls.counter is None:
+            with cls._client_lock:
+                if cls.counter is None:
+                    cls.counter = TOKEN_COUNTER()
+        return cls.counter
+
+    @classmethod
+    def prompt_budget(cls) -> int:
+        return cls.context_window - cls.expected_completion_tokens
+
+    @classmethod
+    def estimate_tokens(cls, request: str) -> int:
+        return cls.get_counter().count(request) + cls.expected_completion_tokens
+
+    @classmethod
+    def _record_usage(cls, request: str, stage: str, usage, completion: str = None):
+        counter = cls.get_counter()
+        estimated = counter.count(request)
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+            counter.calibrate(request, prompt_tokens)
+        else:
+            prompt_tokens, completion_tokens = estimated, counter.count(completion or '')
+        token_usage.record(cls.provider, cls.name, stage, prompt_tokens, completion_tokens, estimated)
+        return prompt_tokens, completion_tokens
+
+    @classmethod
+    def _create(cls, request: str, cancel: CANCEL_SCOPE = None, **kwargs):
+        # returns (completion, tokens acquired from the limiter), the caller settles
+        # against that same estimate once the real usage is known
+        import openai
+
+        limiter = cls.get_limiter()
+        estimated_tokens = cls.estimate_tokens(request)
+        for attempt in range(cls.max_retries + 1):
+            if cancel is not None and cancel.cancelled:
+                raise RequestCancelled(f"{cls.name}: request cancelled")
+            if not limiter.acquire(estimated_tokens, cancel.event if cancel is not None else None):
+                raise RequestCancelled(f"{cls.name}: request cancelled while rate limited")
+            try:
+                completion = cls.get_client().chat.completions.create(
+                    model = cls.name,
+                    messages = [
+                        {"role": "assistant", "content": request}
+                    ],
+                    temperature = cls.temperature,
+                    **kwargs
+                )
+                if cancel is not None and kwargs.get('stream') and not cancel.attach(completion):
+                    # cancelled while the request was being sent
+                    completion.close()
+                    raise RequestCancelled(f"{cls.name}: request cancelled")
+                return completion, estimated_tokens
+            except openai.APIConnectionError as e:
+                error, server_delay = e, None
+            except openai.APIStatusError as e:
+                if e.status_code != 429 and e.status_code < 500:
+                    raise
+                error, server_delay = e, retry_after(e.response.headers)
+
+            # the failed request did not consume provider tokens
+            limiter.settle(estimated_tokens, 0)
+            if attempt == cls.max_retries:
+                raise error
+            delay = backoff_delay(attempt, server_delay = server_delay)
+            print(f"{cls.name}: {error.__class__.__name__}, retrying in {delay:.1f}s")
+            if cancel is None:
+                time.sleep(delay)
+            elif cancel.event.wait(delay):
+                raise RequestCancelled(f"{cls.name}: request cancelled during retry backoff")
+
+    @classmethod
+    def get_answer(cls, request: str, use_cache: bool = True, refresh: bool = None, stage: str = None):
+        with tracer.span('llm.get_answer', provider = cls.provider, model = cls.name, stage = stage) as span:
+            key, response = _cache_key(cls, request, use_cache, refresh)
+            if response is not None:
+                token_usage.record(cls.provider, cls.name, stage, 0, 0, cls.get_counter().count(request), cached = True)
+                span.set(cached = True)
+                return response
+
+            completion, estimated_tokens = cls._create(request)
+            response = completion.choices[0].message.content
+            prompt_tokens, completion_tokens = cls._record_usage(request, stage, getattr(completion, 'usage', None), response)
+            cls.get_limiter().settle(estimated_tokens, prompt_tokens + completion_tokens)
+            span.set(cached = False, prompt_tokens = prompt_tokens, completion_tokens = completion_tokens)
+
+            if key is not None and response is not None:
+                response_cache.put(key, response)
+            return response
+
+    @classmethod
+    def get_answer_stream(cls, request: str, use_cache: bool = True, refresh: bool = None, stage: str = None,
+                          cancel: CANCEL_SCOPE = None):
+        # yields the response text chunk by chunk as it arrives; the span is recorded
+        # once the stream ends since the caller's code runs between the chunks
+        attributes = {'provider': cls.provider, 'model': cls.name, 'stage': stage}
+        start, started = time.time(), time.perf_counter()
+        key, response = _cache_key(cls, request, use_cache, refresh)
+        if response is not None:
+            token_usage.record(cls.provider, cls.name, stage, 0, 0, cls.get_counter().count(request), cached = True)
+            tracer.record('llm.get_answer_stream', start, time.perf_counter() - started, cached = True, **attributes)
+            yield response
+            return
+
+        first_token = None
+        chunks = []
+        usage = None
+        options = {'stream_options': {'include_usage': True}} if cls.stream_usage else {}
+        stream, estimated_tokens = cls._create(request, cancel = cancel, stream = True, **options)
+        finished = False
+        try:
+            for chunk in stream:
+                if getattr(chunk, 'usage', None) is not None:
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    chunks.append(content)
+                    yield content
+            finished = True
+        except Exception:
+            if cancel is not None and cancel.cancelled:
+                # the stream was closed under the reader by cancel()
+                raise RequestCancelled(f"{cls.name}: request cancelled") from None
+            raise
+        finally:
+            # a stream closed early still used its prompt and what was generated so far
+            prompt_tokens, completion_tokens = cls._record_usage(request, stage, usage, ''.join(chunks))
+            cls.get_limiter().settle(estimated_tokens, prompt_tokens + completion_tokens)
+            tracer.record('llm.get_answer_stream', start, time.perf_counter() - started, cached = False,
+                          prompt_tokens = prompt_tokens, completion_tokens = completion_tokens,
+                          time_to_first_token = first_token, complete = finished, **attributes)
+
+        if key is not None:
+            response_cache.put(key, ''.join(chunks))
+
+class KIMI(LLM_PROVIDER):
     name = 'moonshot-v1-8k'
-    key = os.getenv("KIMI_KEY")
-    client = OpenAI(api_key = key, base_url = "https://api.moonshot.cn/v1")
-    def get_answer(request: str):
-        completion = KIMI.client.chat.completions.create(
-            model = "moonshot-v1-8k",
-            messages = [
-                {"role": "assistant", "content": request}
-            ],
-            temperature = 0.0
-        )
-        
-        return completion.choices[0].message.content
-
-class DeepSeek_R1:
-    name = 'deepseek-chat'
-    key = os.getenv("DSV3_KEY")
-    client = OpenAI(api_key = key, base_url = "https://api.deepseek.com")
-    def get_answer(request: str):
-        completion = DeepSeek_R1.client.chat.completions.create(
-            model = "deepseek-chat",
-            messages = [
-                {"role": "assistant", "content": request}
-            ],
-            temperature = 0.0,
-        )
-        
-        return completion.choices[0].message.content
+    provider = 'kimi'
+    key_env = "KIMI_KEY"
+    base_url = "https://api.moonshot.cn/v1"
+    context_window = 8192
 
+class DeepSeek_R1(LLM_PROVIDER):
+    name = 'deepseek-chat'
+    provider = 'deepseek'
+    key_env = "DSV3_KEY"
+    base_url = "https://api.deepseek.com"
+    context_window = 65536
+    stream_usage = True
@@ -0,0 +1,65 @@
+import numpy as np
+
+def _as_runs(response) -> np.ndarray:
+    response = np.asarray(response)
+    if response.ndim == 1:
+        response = response[np.newaxis, :]
+    return response
+
+def gain_db(response) -> np.ndarray:
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(np.abs(_as_runs(response)))
+
+def phase_deg(response) -> np.ndarray:
+    # unwrapped along frequency so a lag beyond -180 degrees stays continuous
+    return np.degrees(np.unwrap(np.angle(_as_runs(response)), axis=1))
+
+def first_crossing(log_frequency: np.ndarray, values: np.ndarray, threshold):
+    # first falling crossing of threshold per run, linear in log-frequency;
+    # returns (log10 f, index of the sample after the crossing, fraction, valid)
+    threshold = np.broadcast_to(np.asarray(threshold, dtype=np.float64).reshape(-1, 1), (values.shape[0], 1))
+    below = values < threshold
+    index = np.argmax(below, axis=1)
+    valid = below.any(axis=1) & (index > 0)
+    index = np.where(valid, index, 1)
+
+    rows = np.arange(values.shape[0])
+    y0 = values[rows, index - 1]
+    y1 = values[rows, index]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(y1 != y0, (threshold[:, 0] - y0) / (y1 - y0), 0.0)
+    fraction = np.clip(fraction, 0.0, 1.0)
+
+    x0 = log_frequency[index - 1]
+    x1 = log_frequency[index]
+    crossing = np.where(valid, x0 + fraction * (x1 - x0), np.nan)
+    return crossing, index, fraction, valid
+
+def ac_metrics(frequency, response) -> dict:
+    # response is complex with shape (n_runs, n_freq) (or (n_freq,) for one run);
+    # every metric comes back as an array of length n_runs, NaN where undefined
+    frequency = np.asarray(frequency, dtype=np.float64)
+    log_frequency = np.log10(frequency)
+    gain = gain_db(response)
+    phase = phase_deg(response)
+    rows = np.arange(gain.shape[0])
+
+    dc_gain = gain[:, 0]
+
+    log_ugf, index, fraction, valid = first_crossing(log_frequency, gain, 0.0)
+    ugf = np.where(valid, 10 ** log_ugf, np.nan)
+
+    # measure the lag relative to the DC phase (0 for non-inverting, +-180 for inverting)
+    reference = 180 * np.round(phase[:, 0] / 180)
+    phase_at_ugf = phase[rows, index - 1] + fraction * (phase[rows, index] - phase[rows, index - 1])
+    phase_margin = np.where(valid, 180 + (phase_at_ugf - reference), np.nan)
+
+    log_bw, _, _, bw_valid = first_crossing(log_frequency, gain, dc_gain - 3)
+    bandwidth = np.where(bw_valid, 10 ** log_bw, np.nan)
+
+    return {
+        'dc_gain_db': dc_gain,
+        'unity_gain_frequency': ugf,
+        'phase_margin': phase_margin,
+        'bandwidth_3db': bandwidth,
+    }
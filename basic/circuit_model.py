@@ -1,6 +1,7 @@
 from dataclasses import dataclass, asdict
 import os
 import json
+from basic.trace import span
 
 def read_file(file_path):
     if not os.path.exists(file_path):
@@ -53,13 +54,18 @@ class CIRCUIT_MODEL:
     def save_model_json(self):
         model_path = f'./model_json/{self.model_name}.json'
         try:
-            model_dict = asdict(self)
-            with open(model_path, 'w') as file:
-                json.dump(model_dict, file, indent=4)
+            with span('save_model_json', model=self.model_name):
+                model_dict = asdict(self)
+                with open(model_path, 'w') as file:
+                    json.dump(model_dict, file, indent=4)
             # print(f"Model saved successfully to {model_path}")
         except Exception as e:
             print(f"Failed to save model: {e}")
 
+    def save_model(self):
+        from basic.model_store import get_model_store
+        get_model_store().save(self)
+
     @staticmethod
     def load_model_json(model_path: str):
         try:
@@ -74,24 +80,29 @@ class CIRCUIT_MODEL:
             return None
 
 
+def load_all_models(json_path: str = './model_json') -> dict:
+    all_models = {}
+    try:
+        for filename in os.listdir(json_path):
+            if filename.endswith('.json'):
+                model = CIRCUIT_MODEL.load_model_json(os.path.join(json_path, filename))
+                if model:
+                    all_models[os.path.splitext(filename)[0]] = model
+    except Exception as e:
+        print(f"Error loading models from directory: {e}")
+    return all_models
+
+
 class MODEL_SET:
-    def __init__(self):
-        self.all_models: dict = None
+    def __init__(self, db_path: str = './model_store.db'):
+        from basic.model_store import MODEL_STORE
+        self.store = MODEL_STORE(db_path)
+        self.all_models: dict = {}
         self.load_all_models('./model_json')
 
-    def save_all_models(self, json_path: str):
-        for key in self.all_models:
-            self.all_models[key].save_model_json
+    def save_all_models(self):
+        self.store.save_many(self.all_models.values())
 
     def load_all_models(self, json_path: str):
-        try:
-            for filename in os.listdir(json_path):
-                if filename.endswith('.json'):
-                    filepath = os.path.join(json_path, filename)
-                    model = CIRCUIT_MODEL.load_model_json(filepath)
-                    if model:
-                        model_key = os.path.splitext(filename)[0]
-                        self.all_models[model_key] = model
-            #print(f"Loaded {len(self.all_models)} models from {json_path}")
-        except Exception as e:
-            print(f"Error loading models from directory: {e}")
\ No newline at end of file
+        self.store.import_json_dir(json_path)
+        self.all_models = self.store.load_all()
@@ -0,0 +1,73 @@
+import numpy as np
+
+def _as_runs(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[np.newaxis, :]
+    return values
+
+def crossing(x: np.ndarray, y: np.ndarray, threshold, rising: bool = False, last: bool = False):
+    # first (or last) crossing of threshold by each row of y, linearly interpolated;
+    # returns (k, fraction, valid) where the crossing lies between samples k and k + 1
+    threshold = np.broadcast_to(np.asarray(threshold, dtype=np.float64).reshape(-1, 1), (y.shape[0], 1))
+    below = y < threshold
+    if rising:
+        edges = below[:, :-1] & ~below[:, 1:]
+    else:
+        edges = ~below[:, :-1] & below[:, 1:]
+
+    valid = edges.any(axis=1)
+    if last:
+        k = edges.shape[1] - 1 - np.argmax(edges[:, ::-1], axis=1)
+    else:
+        k = np.argmax(edges, axis=1)
+
+    rows = np.arange(y.shape[0])
+    y0 = y[rows, k]
+    y1 = y[rows, k + 1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = np.where(y1 != y0, (threshold[:, 0] - y0) / (y1 - y0), 0.0)
+    return k, np.clip(fraction, 0.0, 1.0), valid
+
+def interpolate_at(values: np.ndarray, k: np.ndarray, fraction: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    rows = np.arange(values.shape[0])
+    result = values[rows, k] + fraction * (values[rows, k + 1] - values[rows, k])
+    return np.where(valid, result, np.nan)
+
+def dc_metrics(vin, vout, monotonic_tolerance: float = 0.0) -> dict:
+    # vout has shape (n_runs, n_points) (or (n_points,)), vin is either shared
+    # (n_points,) or per run; every metric is an array of length n_runs, NaN where
+    # undefined (e.g. no unity-gain point on a weak inverter)
+    vout = _as_runs(vout)
+    vin = np.broadcast_to(_as_runs(vin), vout.shape)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gain = np.gradient(vout, axis=1) / np.gradient(vin, axis=1)
+
+    # switching threshold: Vout = Vin
+    k, fraction, valid = crossing(vin, vout - vin, 0.0)
+    vm = interpolate_at(vin, k, fraction, valid)
+
+    # VIL / VIH: first and last points where the slope passes -1
+    k, fraction, vil_valid = crossing(vin, gain, -1.0)
+    vil = interpolate_at(vin, k, fraction, vil_valid)
+    voh = interpolate_at(vout, k, fraction, vil_valid)
+
+    k, fraction, vih_valid = crossing(vin, gain, -1.0, rising=True, last=True)
+    vih = interpolate_at(vin, k, fraction, vih_valid)
+    vol = interpolate_at(vout, k, fraction, vih_valid)
+
+    step = np.diff(vout, axis=1)
+    monotonic = np.all(step <= monotonic_tolerance, axis=1) | np.all(step >= -monotonic_tolerance, axis=1)
+
+    return {
+        'switching_threshold': vm,
+        'vil': vil,
+        'vih': vih,
+        'voh': voh,
+        'vol': vol,
+        'nml': vil - vol,
+        'nmh': voh - vih,
+        'max_gain': np.nanmax(np.abs(gain), axis=1),
+        'monotonic': monotonic,
+    }
@@ -0,0 +1,22 @@
+import json
+import hashlib
+from basic.circuit_model import CIRCUIT_MODEL
+from basic.prompt_template import PROMPT_TEMPLATE, get_template
+
+def used_replacements(model: CIRCUIT_MODEL, template: PROMPT_TEMPLATE) -> dict:
+    # only the fields whose placeholder appears in the template can change the prompt
+    return {key: value for key, value in model.get_replacement().items() if key in template.placeholders}
+
+def stage_fingerprint(model: CIRCUIT_MODEL, prompt_path: str, provider, racing: list = None) -> str:
+    # racing: the providers the stage prompt is raced across, any of them may answer
+    template = get_template(prompt_path)
+    fields = {
+        'fields': used_replacements(model, template),
+        'template': template.text,
+        'provider': provider.provider,
+        'model': provider.name,
+    }
+    if racing:
+        fields['racing'] = sorted(f"{racer.provider}/{racer.name}" for racer in racing)
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
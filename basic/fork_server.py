@@ -0,0 +1,342 @@
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import select
+import signal
+import tempfile
+import threading
+import importlib
+import subprocess
+from pathlib import Path
+from concurrent.futures import Future
+
+root_dir = str(Path(__file__).parent.parent)
+
+# what generated testbenches import, loaded once in the template process
+preload_modules = (
+    'numpy',
+    'matplotlib.pyplot',
+    'matplotlib.ticker',
+    'PySpice.Unit',
+    'PySpice.Spice.Netlist',
+    'PySpice.Probe.Plot',
+    'PySpice.Spice.NgSpice.Shared',
+    'basic.sim_watchdog',
+    'basic.sim_cache',
+)
+
+# provider API keys and other credentials are not passed on to generated code
+secret_name_pattern = re.compile(r'KEY|TOKEN|SECRET|PASSWORD|CREDENTIAL', re.IGNORECASE)
+
+class ForkServerError(RuntimeError):
+    pass
+
+
+def sandbox_environ(environ: dict = None, **extra) -> dict:
+    environ = os.environ if environ is None else environ
+    env = {name: value for name, value in environ.items() if not secret_name_pattern.search(name)}
+    env.update(extra)
+    return env
+
+
+# ---- template process ----
+
+def preload() -> dict:
+    # module name -> mtime of its file, for the modules/ circuits a child may have to reload
+    import matplotlib
+    matplotlib.use('Agg')
+    for name in preload_modules:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"preload of {name} failed: {e}", file=sys.stderr)
+
+    from basic import sim_watchdog
+    from basic.sim_cache import CACHED_NGSPICE
+    sim_watchdog.install(None, instance_class=CACHED_NGSPICE)
+
+    loaded = {}
+    for path in sorted(Path(root_dir, 'modules').glob('*.py')):
+        name = 'modules' if path.stem == '__init__' else f'modules.{path.stem}'
+        try:
+            importlib.import_module(name)
+            loaded[name] = path.stat().st_mtime_ns
+        except Exception as e:
+            print(f"preload of {name} failed: {e}", file=sys.stderr)
+
+    # loading libngspice and its spinit is the slowest part of a first simulation
+    try:
+        from PySpice.Spice.NgSpice.Shared import NgSpiceShared
+        NgSpiceShared.new_instance()
+    except Exception as e:
+        print(f"ngspice is not preloaded: {e}", file=sys.stderr)
+    return loaded
+
+def drop_stale_modules(loaded: dict):
+    # a circuit regenerated after the template started has to be imported again
+    for name, mtime in loaded.items():
+        module = sys.modules.get(name)
+        path = getattr(module, '__file__', None)
+        try:
+            if path is None or os.stat(path).st_mtime_ns != mtime:
+                sys.modules.pop(name, None)
+        except OSError:
+            sys.modules.pop(name, None)
+
+def set_limits(cpu_seconds: float = None, memory_limit: int = None):
+    import resource
+    if cpu_seconds:
+        limit = int(cpu_seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (limit, limit + 1))
+    if memory_limit:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def run_child(request: dict, out_path: str, err_path: str, loaded: dict):
+    # runs in the forked child, never returns
+    code = 1
+    try:
+        os.setsid()
+        for fd, path in ((1, out_path), (2, err_path)):
+            target = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.dup2(target, fd)
+            os.close(target)
+        set_limits(request.get('timeout'), request.get('memory_limit'))
+        drop_stale_modules(loaded)
+
+        from basic import sim_watchdog
+        from PySpice.Spice.NgSpice.Shared import NgSpiceShared
+        budget = request.get('analysis_budget')
+        sim_watchdog.WATCHDOG_NGSPICE.time_budget = budget
+        # the preloaded instance was created unwatched
+        for instance in NgSpiceShared._instances.values():
+            instance.time_budget = budget
+        os.environ['MPLBACKEND'] = 'Agg'
+        code = sim_watchdog.run_script(request['path'], request.get('args'))
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+def read_output(path: str) -> str:
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as file:
+            return file.read()
+    except OSError:
+        return ''
+    finally:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+def serve(poll_interval: float = 0.02):
+    # requests come in on stdin, one JSON object per line; responses go out on
+    # the original stdout, everything else printed here ends up on stderr
+    protocol = os.fdopen(os.dup(1), 'w', encoding='utf-8')
+    os.dup2(2, 1)
+    os.chdir(root_dir)
+
+    start = time.perf_counter()
+    loaded = preload()
+    work_dir = tempfile.mkdtemp(prefix='cxmt_fork_')
+    protocol.write(json.dumps({'ready': True, 'pid': os.getpid(),
+                               'preload_time': time.perf_counter() - start}) + '\n')
+    protocol.flush()
+
+    # pid -> (request, started, deadline, stdout path, stderr path)
+    running = {}
+    killed = set()
+    buffer = b''
+    closing = False
+
+    def respond(pid: int, status: int):
+        request, started, _, out_path, err_path = running.pop(pid)
+        timed_out = pid in killed
+        killed.discard(pid)
+        response = {
+            'id': request['id'],
+            'returncode': None if timed_out else os.waitstatus_to_exitcode(status),
+            'timed_out': timed_out,
+            'duration': time.perf_counter() - started,
+            'stdout': read_output(out_path),
+            'stderr': read_output(err_path),
+        }
+        protocol.write(json.dumps(response) + '\n')
+        protocol.flush()
+
+    while not closing or running:
+        if not closing:
+            readable, _, _ = select.select([0], [], [], poll_interval)
+            if readable:
+                data = os.read(0, 1 << 16)
+                closing = not data
+                buffer += data
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    request = json.loads(line)
+                    out_path = os.path.join(work_dir, f"{request['id']}.out")
+                    err_path = os.path.join(work_dir, f"{request['id']}.err")
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    started = time.perf_counter()
+                    pid = os.fork()
+                    if pid == 0:
+                        protocol.close()
+                        run_child(request, out_path, err_path, loaded)
+                    timeout = request.get('timeout')
+                    running[pid] = (request, started, started + timeout if timeout else None, out_path, err_path)
+        else:
+            time.sleep(poll_interval)
+
+        while running:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in running:
+                respond(pid, status)
+
+        now = time.perf_counter()
+        for pid, (_, _, deadline, _, _) in running.items():
+            if deadline is not None and now > deadline and pid not in killed:
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                killed.add(pid)
+
+    os.rmdir(work_dir)
+
+
+# ---- client ----
+
+class FORK_SERVER:
+    # starts the template process and hands it test scripts, one forked child each
+    def __init__(self, memory_limit: int = 4096, start_timeout: float = 60):
+        self.memory_limit = memory_limit
+        self.start_timeout = start_timeout
+        self.process = None
+        self.preload_time = None
+        self._pending = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available() -> bool:
+        return hasattr(os, 'fork')
+
+    def start(self):
+        with self._lock:
+            if self.process is not None and self.process.poll() is None:
+                return
+            # the template and every child forked from it run without the provider keys
+            env = sandbox_environ(MPLBACKEND='Agg')
+            self.process = subprocess.Popen(
+                [sys.executable, '-m', 'basic.fork_server'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                cwd=root_dir,
+                env=env,
+                text=True,
+                bufsize=1
+            )
+            ready = self._read_ready(self.process)
+            self.preload_time = ready['preload_time']
+            threading.Thread(target=self._read_responses, args=(self.process,), daemon=True).start()
+
+    def _read_ready(self, process) -> dict:
+        readable, _, _ = select.select([process.stdout], [], [], self.start_timeout)
+        line = process.stdout.readline() if readable else ''
+        if not line:
+            process.kill()
+            raise ForkServerError("fork server did not start")
+        return json.loads(line)
+
+    def _read_responses(self, process):
+        for line in process.stdout:
+            response = json.loads(line)
+            with self._lock:
+                future = self._pending.pop(response['id'], None)
+            if future is not None:
+                future.set_result(response)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ForkServerError("fork server exited"))
+
+    def submit(self, path: str, timeout: float = 120, analysis_budget: float = None, args: list = None) -> Future:
+        self.start()
+        future = Future()
+        with self._lock:
+            self._next_id += 1
+            request = {'id': self._next_id, 'path': os.path.abspath(path), 'args': list(args or []),
+                       'timeout': timeout, 'analysis_budget': analysis_budget, 'memory_limit': self.memory_limit}
+            self._pending[request['id']] = future
+            try:
+                self.process.stdin.write(json.dumps(request) + '\n')
+                self.process.stdin.flush()
+            except OSError:
+                self._pending.pop(request['id'], None)
+                raise ForkServerError("fork server is not running") from None
+        return future
+
+    def run(self, path: str, timeout: float = 120, analysis_budget: float = None, args: list = None) -> dict:
+        # same fields as testbench_runner.run_test_file
+        from basic.testbench_runner import classify_output
+        response = self.submit(path, timeout, analysis_budget, args).result()
+        status = 'timeout' if response['timed_out'] else classify_output(response['returncode'], response['stdout'])
+        return {
+            'status': status,
+            'duration': response['duration'],
+            'returncode': response['returncode'],
+            'stdout': response['stdout'],
+            'stderr': response['stderr'],
+        }
+
+    def close(self):
+        with self._lock:
+            process, self.process = self.process, None
+        if process is not None and process.poll() is None:
+            # the template finishes the running children once stdin closes
+            process.stdin.close()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_server = None
+_default_lock = threading.Lock()
+
+def get_fork_server() -> FORK_SERVER:
+    global _default_server
+    with _default_lock:
+        if _default_server is None:
+            _default_server = FORK_SERVER()
+            atexit.register(_default_server.close)
+        return _default_server
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,154 @@
+import re
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+test_item_title = re.compile(r'Test_Item\s+\d+$')
+module_title = re.compile(r'Module\s+\d+$', re.IGNORECASE)
+module_fields = re.compile(
+    r'\s*Model:\s*(.*?)\s*\n'
+    r'Description:\s*(.*?)\s*\n'
+    r'Input\s+Nodes:\s*(.*?)\s*\n'
+    r'Output\s+Nodes:\s*(.*?)\s*\Z',
+    re.DOTALL | re.IGNORECASE
+)
+
+@dataclass
+class HEADING:
+    level: int = None
+    title: str = None
+    start: int = None
+    # the section body runs from body_start up to the next heading of any level
+    body_start: int = None
+    end: int = None
+    fences: list = field(default_factory=list)
+
+@dataclass
+class FENCE:
+    language: str = None
+    content: str = None
+    start: int = None
+    end: int = None
+    # index into MARKDOWN_INDEX.headings, None before the first heading
+    section: int = None
+
+
+class MARKDOWN_INDEX:
+    # one pass over the lines of a response; headings inside fenced code are
+    # ignored and an unterminated fence runs to the end of the text
+    def __init__(self, text: str):
+        self.text = text
+        self.headings = []
+        self.fences = []
+        self.by_title = {}
+        self._tokenize()
+        self.fence_starts = [fence.start for fence in self.fences]
+
+    def _tokenize(self):
+        text = self.text
+        position = 0
+        fence = None
+        fence_marker = None
+        content_start = None
+        for line in text.splitlines(keepends=True):
+            line_start = position
+            position += len(line)
+            stripped = line.lstrip()
+
+            if fence is not None:
+                if stripped.startswith(fence_marker) and not stripped.rstrip().strip(fence_marker[0]):
+                    fence.content = text[content_start:line_start]
+                    fence.end = position
+                    self._add_fence(fence)
+                    fence = None
+                continue
+
+            if stripped.startswith('```') or stripped.startswith('~~~'):
+                marker = stripped[:len(stripped) - len(stripped.lstrip(stripped[0]))]
+                fence = FENCE(language=stripped[len(marker):].strip(), start=line_start,
+                              section=len(self.headings) - 1 if self.headings else None)
+                fence_marker = marker
+                content_start = position
+                continue
+
+            if line.startswith('#'):
+                level = len(line) - len(line.lstrip('#'))
+                rest = line[level:]
+                if level <= 6 and (not rest.strip() or rest[0] in ' \t'):
+                    if self.headings:
+                        self.headings[-1].end = line_start
+                    heading = HEADING(level=level, title=rest.strip().rstrip('#').strip(),
+                                      start=line_start, body_start=position)
+                    self.by_title.setdefault(heading.title, []).append(len(self.headings))
+                    self.headings.append(heading)
+
+        if fence is not None:
+            fence.content = text[content_start:]
+            fence.end = len(text)
+            self._add_fence(fence)
+        if self.headings:
+            self.headings[-1].end = len(text)
+
+    def _add_fence(self, fence: FENCE):
+        self.fences.append(fence)
+        if fence.section is not None:
+            self.headings[fence.section].fences.append(fence)
+
+    def section_text(self, heading: HEADING) -> str:
+        return self.text[heading.body_start:heading.end]
+
+    def find(self, title: str, level: int = None) -> list[HEADING]:
+        headings = [self.headings[i] for i in self.by_title.get(title, [])]
+        if level is not None:
+            headings = [heading for heading in headings if heading.level == level]
+        return headings
+
+    def fences_between(self, start: int, end: int, language: str = None) -> list[FENCE]:
+        fences = self.fences[bisect_left(self.fence_starts, start):bisect_left(self.fence_starts, end)]
+        if language is not None:
+            fences = [fence for fence in fences if fence.language == language]
+        return fences
+
+    def code_block(self, segment_leader: str, language: str, min_level: int = 3) -> str:
+        # the fence has to open the section, only blank lines may come between;
+        # "###" or deeper like the regex this replaced, "## NetList Code" does not count,
+        # min_level=2 for sections the prompt asks for as "##" (Topology)
+        for heading in self.find(segment_leader):
+            if heading.level < min_level or not heading.fences:
+                continue
+            fence = heading.fences[0]
+            if fence.language == language and not self.text[heading.body_start:fence.start].strip():
+                return fence.content.strip()
+        return None
+
+    def test_items(self) -> list[tuple]:
+        # (python, markdown) per "#### Test_Item N"; an item runs up to the next
+        # Test_Item heading, so nested headings belong to it
+        starts = [heading for heading in self.headings if heading.level == 4 and test_item_title.match(heading.title)]
+        items = []
+        for i, heading in enumerate(starts):
+            end = starts[i + 1].start if i + 1 < len(starts) else len(self.text)
+            python = self.fences_between(heading.body_start, end, 'python')
+            markdown = self.fences_between(heading.body_start, end, 'markdown')
+            items.append((
+                python[0].content.strip() if python else None,
+                markdown[0].content.strip() if markdown else None,
+            ))
+        return items
+
+    def module_blocks(self) -> list[tuple]:
+        # (model, description, input nodes, output nodes) per "#### Module N"
+        blocks = []
+        for heading in self.headings:
+            if heading.level != 4 or not module_title.match(heading.title):
+                continue
+            match = module_fields.match(self.section_text(heading))
+            if match:
+                blocks.append(tuple(group.strip() for group in match.groups()))
+        return blocks
+
+
+@lru_cache(maxsize=16)
+def parse_markdown(text: str) -> MARKDOWN_INDEX:
+    # the stages run several extractors over the same response, parse it once
+    return MARKDOWN_INDEX(text)
@@ -0,0 +1,179 @@
+import os
+import json
+import sqlite3
+import threading
+from basic.circuit_model import CIRCUIT_MODEL, load_all_models
+from basic.trace import span
+
+# fields kept in the models table and loaded eagerly
+summary_fields = ('model_name', 'model_description', 'inputnode', 'outputnode',
+                  'parameter', 'parameter_description', 'testDescription', 'submodel_names')
+# large fields kept in model_blobs and only read when first accessed
+lazy_fields = ('netlist', 'testcode')
+json_fields = ('testDescription', 'submodel_names', 'testcode')
+
+def _encode(field: str, value):
+    if field in json_fields and value is not None:
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+def _decode(field: str, value):
+    if field in json_fields and value is not None:
+        return json.loads(value)
+    return value
+
+
+class LAZY_CIRCUIT_MODEL(CIRCUIT_MODEL):
+    # netlist and testcode are fetched from the store on first access, the
+    # dataclass defaults live on the class so __getattr__ would never fire
+    def __getattribute__(self, name: str):
+        if name in lazy_fields:
+            instance_dict = object.__getattribute__(self, '__dict__')
+            if name not in instance_dict and '_store' in instance_dict:
+                instance_dict['_store'].load_lazy_fields(self)
+        return object.__getattribute__(self, name)
+
+
+class MODEL_STORE:
+    def __init__(self, db_path: str = './model_store.db'):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self.conn:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(f'''CREATE TABLE IF NOT EXISTS models (
+                {', '.join(f'{field} TEXT' for field in summary_fields)}
+            )''')
+            self.conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS models_model_name ON models (model_name)')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS model_blobs (
+                model_name TEXT PRIMARY KEY, netlist TEXT, testcode TEXT
+            )''')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS stage_fingerprints (
+                model_name TEXT, stage TEXT, fingerprint TEXT, PRIMARY KEY (model_name, stage)
+            )''')
+
+    def _model_from_row(self, row) -> LAZY_CIRCUIT_MODEL:
+        model = LAZY_CIRCUIT_MODEL()
+        for field in lazy_fields:
+            model.__dict__.pop(field, None)
+        for field, value in zip(summary_fields, row):
+            model.__dict__[field] = _decode(field, value)
+        model.__dict__['_store'] = self
+        return model
+
+    def load_lazy_fields(self, model: CIRCUIT_MODEL):
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT netlist, testcode FROM model_blobs WHERE model_name = ?', (model.model_name,)
+            ).fetchone()
+        values = row if row is not None else (None, None)
+        for field, value in zip(lazy_fields, values):
+            model.__dict__.setdefault(field, _decode(field, value))
+
+    def get(self, model_name: str) -> LAZY_CIRCUIT_MODEL:
+        with self._lock:
+            row = self.conn.execute(
+                f'SELECT {", ".join(summary_fields)} FROM models WHERE model_name = ?', (model_name,)
+            ).fetchone()
+        return self._model_from_row(row) if row is not None else None
+
+    def load_all(self) -> dict:
+        with self._lock:
+            rows = self.conn.execute(f'SELECT {", ".join(summary_fields)} FROM models').fetchall()
+        return {row[0]: self._model_from_row(row) for row in rows}
+
+    def model_names(self) -> list[str]:
+        with self._lock:
+            return [row[0] for row in self.conn.execute('SELECT model_name FROM models ORDER BY model_name')]
+
+    def _write(self, model: CIRCUIT_MODEL):
+        summary = [_encode(field, model.__dict__.get(field)) for field in summary_fields]
+        self.conn.execute(
+            f'INSERT OR REPLACE INTO models ({", ".join(summary_fields)}) '
+            f'VALUES ({", ".join("?" for _ in summary_fields)})',
+            summary
+        )
+        # a lazy model only writes the large fields that were read or assigned,
+        # the others keep what the store has
+        fields = lazy_fields
+        if isinstance(model, LAZY_CIRCUIT_MODEL):
+            fields = [field for field in lazy_fields if field in model.__dict__]
+        if not fields:
+            return
+        self.conn.execute('INSERT OR IGNORE INTO model_blobs (model_name) VALUES (?)', (model.model_name,))
+        self.conn.execute(
+            f'UPDATE model_blobs SET {", ".join(f"{field} = ?" for field in fields)} WHERE model_name = ?',
+            [_encode(field, getattr(model, field)) for field in fields] + [model.model_name]
+        )
+
+    def save(self, model: CIRCUIT_MODEL):
+        self.save_many([model])
+
+    def save_many(self, models):
+        # one transaction, either every model is written or none is
+        models = list(models)
+        with span('model_store.save', models=len(models)), self._lock, self.conn:
+            for model in models:
+                self._write(model)
+
+    def delete(self, model_name: str):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM models WHERE model_name = ?', (model_name,))
+            self.conn.execute('DELETE FROM model_blobs WHERE model_name = ?', (model_name,))
+            self.conn.execute('DELETE FROM stage_fingerprints WHERE model_name = ?', (model_name,))
+
+    def get_fingerprint(self, model_name: str, stage: str) -> str:
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT fingerprint FROM stage_fingerprints WHERE model_name = ? AND stage = ?',
+                (model_name, stage)
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set_fingerprint(self, model_name: str, stage: str, fingerprint: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO stage_fingerprints (model_name, stage, fingerprint) VALUES (?, ?, ?)',
+                (model_name, stage, fingerprint)
+            )
+
+    def clear_fingerprints(self, model_name: str):
+        with self._lock, self.conn:
+            self.conn.execute('DELETE FROM stage_fingerprints WHERE model_name = ?', (model_name,))
+
+    def import_json_dir(self, json_path: str = './model_json', force: bool = False) -> int:
+        # one-time migration of the old one-JSON-file-per-model layout
+        with self._lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+        if done is not None and not force:
+            return 0
+        models = load_all_models(json_path) if os.path.isdir(json_path) else {}
+        with self._lock, self.conn:
+            for model in models.values():
+                self._write(model)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_imported', ?)",
+                              (os.path.abspath(json_path),))
+        return len(models)
+
+    def export_json_dir(self, json_path: str = './model_json'):
+        os.makedirs(json_path, exist_ok=True)
+        for name, model in self.load_all().items():
+            with open(os.path.join(json_path, f'{name}.json'), 'w') as file:
+                json.dump({field: getattr(model, field) for field in summary_fields + lazy_fields}, file, indent=4)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_model_store(db_path: str = './model_store.db', json_path: str = './model_json') -> MODEL_STORE:
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = MODEL_STORE(db_path)
+            _default_store.import_json_dir(json_path)
+    return _default_store
@@ -0,0 +1,74 @@
+import inspect
+import threading
+from collections import OrderedDict
+
+class CACHED_SUBCIRCUIT:
+    # stands in for a SubCircuitFactory instance in Circuit.subcircuit(),
+    # PySpice only needs its name and its rendered text
+    def __init__(self, module_class, text: str):
+        self.NAME = module_class.NAME
+        self.NODES = module_class.NODES
+        self.name = module_class.NAME
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+
+def _normalize(value):
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    try:
+        # 1e-6 and 0.000001 map onto the same key; the type stays in it because
+        # a module may render 2 and 2.0 (or 1@u_um) differently
+        return type(value).__qualname__, float(value)
+    except (TypeError, ValueError):
+        return repr(value)
+
+class NETLIST_CACHE:
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(module_class, args: tuple, kwargs: dict):
+        bound = inspect.signature(module_class).bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple(sorted((name, _normalize(value)) for name, value in bound.arguments.items()))
+        return (module_class.__module__, module_class.__qualname__, arguments)
+
+    def get(self, module_class, *args, **kwargs) -> CACHED_SUBCIRCUIT:
+        key = self.make_key(module_class, args, kwargs)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        entry = CACHED_SUBCIRCUIT(module_class, str(module_class(*args, **kwargs)))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+netlist_cache = NETLIST_CACHE()
+
+def cached_subcircuit(module_class, *args, **kwargs) -> CACHED_SUBCIRCUIT:
+    return netlist_cache.get(module_class, *args, **kwargs)
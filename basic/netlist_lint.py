@@ -0,0 +1,361 @@
+import os
+import re
+import sys
+import json
+import inspect
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+root_dir = str(Path(__file__).parent.parent)
+
+from PySpice.Spice.Netlist import SubCircuit, SubCircuitFactory
+from PySpice.Spice.BasicElement import SubCircuitElement
+
+ground_names = {'0', 'gnd'}
+supply_pattern = re.compile(r'^(0|gnd|[ad]?gnd|v?dd[a-z0-9]*|v?ss[a-z0-9]*|vcc|vee|vpp|vnn)$', re.IGNORECASE)
+# elements whose pins never carry DC current between each other
+blocking_elements = ('Capacitor', 'BehavioralCapacitor', 'SemiconductorCapacitor', 'CurrentSource',
+                     'NonLinearCurrentSource', 'VoltageControlledCurrentSource', 'CurrentControlledCurrentSource')
+# pins that only sense: MOSFET/JFET gates and bulks, controlled-source inputs
+sensing_pins = {'gate', 'bulk', 'input_plus', 'input_minus'}
+# prefix of the line the --json CLI reports its issues on, generated code may print too
+result_marker = 'Lint_Result: '
+
+@dataclass
+class LINT_ISSUE:
+    severity: str = None
+    check: str = None
+    subject: str = None
+    message: str = None
+
+    def __str__(self):
+        return f"{self.severity}: [{self.check}] {self.subject}: {self.message}"
+
+
+class UNION_FIND:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+
+def is_ground(node: str) -> bool:
+    return node.lower() in ground_names
+
+def is_supply(node: str) -> bool:
+    return bool(supply_pattern.match(node))
+
+def _pins(element) -> list[tuple]:
+    # (pin name, node name); subcircuit instance pins have no names
+    return [(pin.name or f"pin{i + 1}", str(pin.node)) for i, pin in enumerate(element.pins)]
+
+def _ports(netlist) -> tuple:
+    return tuple(getattr(netlist, 'NODES', None) or getattr(netlist, '_external_nodes', None) or ())
+
+def _value(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class NETLIST_LINTER:
+    def __init__(self, library: dict = None):
+        # library: subcircuit name -> SubCircuit for X instances not defined in the netlist itself
+        self.library = dict(library or {})
+        self.issues = []
+        self._port_groups = {}
+
+    def report(self, severity: str, check: str, subject: str, message: str):
+        self.issues.append(LINT_ISSUE(severity, check, subject, message))
+
+    def find_subcircuit(self, name: str, scopes: list):
+        for scope in reversed(scopes):
+            for subcircuit in scope.subcircuits:
+                if subcircuit.name == name:
+                    return subcircuit
+        return self.library.get(name)
+
+    def find_model(self, name: str, scopes: list):
+        for scope in reversed(scopes):
+            for model in scope.models:
+                if model.name == name:
+                    return model
+        return None
+
+    def dc_groups(self, element, scopes: list) -> list[list[str]]:
+        # sets of nodes this element ties together at DC
+        pins = _pins(element)
+        kind = type(element).__name__
+        if kind in blocking_elements:
+            return []
+        if isinstance(element, SubCircuitElement):
+            callee = self.find_subcircuit(element.subcircuit_name, scopes)
+            if callee is None or len(_ports(callee)) != len(pins):
+                return []
+            index = {port: i for i, port in enumerate(_ports(callee))}
+            return [[pins[index[port]][1] for port in group] for group in self.port_groups(callee, scopes)]
+        return [[node for pin, node in pins if pin not in sensing_pins]]
+
+    def port_groups(self, subcircuit, scopes: list) -> list[list[str]]:
+        # ports of a subcircuit that are DC-connected through its insides
+        key = id(subcircuit)
+        if key not in self._port_groups:
+            self._port_groups[key] = []
+            union = UNION_FIND()
+            inner_scopes = scopes + [subcircuit]
+            for element in subcircuit.elements:
+                for group in self.dc_groups(element, inner_scopes):
+                    for node in group[1:]:
+                        union.union(group[0], node)
+            groups = {}
+            for port in _ports(subcircuit):
+                groups.setdefault(union.find(port), []).append(port)
+            self._port_groups[key] = [group for group in groups.values() if len(group) > 1]
+        return self._port_groups[key]
+
+    def lint(self, netlist, scopes: list = None, prefix: str = ''):
+        scopes = (scopes or []) + [netlist]
+        name = prefix + (getattr(netlist, 'name', None) or getattr(netlist, 'NAME', None) or 'circuit')
+        ports = _ports(netlist)
+        is_subcircuit = isinstance(netlist, SubCircuit)
+        elements = list(netlist.elements)
+        element_names = {element.name: element for element in elements}
+
+        connections = {}
+        union = UNION_FIND()
+        for element in elements:
+            for pin, node in _pins(element):
+                connections.setdefault(node, []).append((element, pin))
+            for group in self.dc_groups(element, scopes):
+                for node in group[1:]:
+                    union.union(group[0], node)
+            self.lint_element(element, scopes, name, ports if is_subcircuit else ())
+
+        # unused ports
+        for port in ports:
+            if port not in connections:
+                self.report('warning', 'unused_port', name, f"port {port} is not connected to anything")
+
+        references = {union.find(node) for node in connections if is_ground(node) or node in ports}
+        for node, attached in connections.items():
+            if is_ground(node) or node in ports:
+                continue
+            subject = f"{name}/{node}"
+            device = element_names.get(node) or next(
+                (element for element in elements if element.name[1:] == node), None)
+            if device is not None:
+                self.report('warning', 'node_named_after_device', subject,
+                            f"node has the name of device {device.name}, probably meant one of its terminals")
+            if len(attached) == 1:
+                element, pin = attached[0]
+                self.report('error', 'floating_node', subject, f"only connected to {element.name} ({pin})")
+            elif union.find(node) not in references:
+                self.report('error', 'no_dc_path', subject,
+                            "no DC path to ground or to a port, only capacitors, gates or current sources attached")
+            self.check_one_sided(node, attached, scopes, subject)
+
+        self.check_models(netlist, scopes, name)
+        for subcircuit in netlist.subcircuits:
+            self.lint(subcircuit, scopes, name + '.')
+
+    def lint_element(self, element, scopes: list, name: str, ports: tuple):
+        subject = f"{name}/{element.name}"
+        pins = _pins(element)
+        kind = type(element).__name__
+
+        if isinstance(element, SubCircuitElement):
+            callee = self.find_subcircuit(element.subcircuit_name, scopes)
+            if callee is None:
+                self.report('error', 'unknown_subcircuit', subject,
+                            f"instance of {element.subcircuit_name}, which is not defined")
+                return
+            callee_ports = _ports(callee)
+            if len(callee_ports) != len(pins):
+                self.report('error', 'pin_count', subject,
+                            f"{len(pins)} nodes given, {element.subcircuit_name} has {len(callee_ports)} "
+                            f"({', '.join(callee_ports)})")
+                return
+            if element.parameters and not getattr(callee, '_parameters', None):
+                self.report('error', 'instance_parameters', subject,
+                            f"passes {', '.join(element.parameters)} but {element.subcircuit_name} takes no "
+                            "parameters, set them on the subcircuit() definition instead")
+            # two different supply pins of the callee tied to one net
+            supplies = {}
+            for port, (_, node) in zip(callee_ports, pins):
+                if is_supply(port):
+                    supplies.setdefault(node, set()).add(port.lower())
+            for node, tied in supplies.items():
+                if len(tied) > 1:
+                    self.report('error', 'shorted_supply', subject,
+                                f"supply pins {', '.join(sorted(tied))} are all connected to {node}")
+            return
+
+        nodes = [node for _, node in pins]
+        if kind in ('Mosfet', 'JunctionFieldEffectTransistor', 'Mesfet'):
+            terminals = dict(pins)
+            if terminals.get('drain') == terminals.get('source'):
+                self.report('warning', 'shorted_channel', subject,
+                            f"drain and source are both on {terminals.get('drain')}")
+        if kind == 'VoltageSource' and len(set(nodes)) == 1:
+            self.report('error', 'shorted_source', subject, f"both terminals on {nodes[0]}")
+        if len(nodes) == 2 and nodes[0] != nodes[1] and all(is_supply(node) for node in nodes):
+            zero_resistor = kind == 'Resistor' and _value(getattr(element, 'resistance', None)) == 0
+            # a source across two supply ports fights whatever drives them outside
+            if zero_resistor or kind == 'Inductor' or (kind == 'VoltageSource' and all(node in ports for node in nodes)):
+                self.report('error', 'shorted_supply', subject, f"{kind} directly between {nodes[0]} and {nodes[1]}")
+
+        model_name = getattr(element, 'model', None)
+        if isinstance(model_name, str) and self.find_model(model_name, scopes) is None:
+            self.report('error', 'undefined_model', subject, f"model {model_name} is not defined")
+
+    def check_one_sided(self, node: str, attached: list, scopes: list, subject: str):
+        # a node that only NMOS (or only PMOS) channels touch is pulled one way only
+        polarities = set()
+        for element, pin in attached:
+            if type(element).__name__ != 'Mosfet' or pin not in ('drain', 'source'):
+                return
+            model = self.find_model(getattr(element, 'model', None), scopes)
+            if model is None:
+                return
+            polarities.add(str(model.model_type).lower())
+        if len(polarities) == 1:
+            polarity = polarities.pop()
+            self.report('warning', 'one_sided_node', subject,
+                        f"only {polarity} channels connect here, nothing pulls it the other way")
+
+    def check_models(self, netlist, scopes: list, name: str):
+        # a model redefined with other parameters in an enclosing scope is easy to misread
+        for model in netlist.models:
+            for scope in scopes[:-1]:
+                for outer in scope.models:
+                    if outer.name == model.name and (outer.model_type != model.model_type
+                                                     or outer._parameters != model._parameters):
+                        self.report('warning', 'duplicate_model', f"{name}/{model.name}",
+                                    f"also defined with different parameters in "
+                                    f"{getattr(scope, 'name', None) or 'the top level'}")
+
+
+def lint_netlist(netlist, library: dict = None) -> list[LINT_ISSUE]:
+    linter = NETLIST_LINTER(library)
+    linter.lint(netlist)
+    return linter.issues
+
+def default_arguments(factory_class) -> dict:
+    # required constructor arguments get a placeholder, only the structure matters here
+    arguments = {}
+    for name, parameter in inspect.signature(factory_class).parameters.items():
+        if parameter.kind in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD):
+            continue
+        if parameter.default is parameter.empty:
+            arguments[name] = 1e-6
+    return arguments
+
+def load_factories(code: str, module_name: str = 'generated_netlist', file_path: str = None) -> tuple:
+    # runs netlist code and returns (factory classes it defines, error issue or None),
+    # only to be called on generated code inside lint_code_isolated's child process
+    saved_path = sys.path[:]
+    if root_dir not in sys.path:
+        sys.path.append(root_dir)
+    # module files locate the repository from __file__
+    namespace = {'__name__': module_name,
+                 '__file__': file_path or os.path.join(root_dir, 'modules', f'{module_name}.py')}
+    try:
+        exec(compile(code, f'<{module_name}>', 'exec'), namespace)
+    except BaseException as e:
+        # sys.exit() in generated code is a broken netlist, not the end of the caller
+        return [], LINT_ISSUE('error', 'load_error', module_name, f"{e.__class__.__name__}: {e}")
+    finally:
+        sys.path[:] = saved_path
+    factories = [value for value in namespace.values()
+                 if inspect.isclass(value) and issubclass(value, SubCircuitFactory)
+                 and value is not SubCircuitFactory and value.__module__ == module_name]
+    return factories, None
+
+def lint_factory(factory_class, library: dict = None, **kwargs) -> list[LINT_ISSUE]:
+    arguments = default_arguments(factory_class)
+    arguments.update(kwargs)
+    try:
+        instance = factory_class(**arguments)
+    except NameError as e:
+        # PySpice refuses a second model or element with the same name
+        check = 'duplicate_model' if 'Model name' in str(e) else 'duplicate_element'
+        return [LINT_ISSUE('error', check, factory_class.__name__, str(e))]
+    except BaseException as e:
+        return [LINT_ISSUE('error', 'load_error', factory_class.__name__, f"{e.__class__.__name__}: {e}")]
+    return lint_netlist(instance, library)
+
+def lint_code(code: str, library: dict = None, file_path: str = None) -> list[LINT_ISSUE]:
+    factories, error = load_factories(code, file_path=file_path)
+    if error is not None:
+        return [error]
+    if not factories:
+        return [LINT_ISSUE('error', 'load_error', 'generated_netlist', "no SubCircuitFactory class defined")]
+    issues = []
+    for factory_class in factories:
+        issues.extend(lint_factory(factory_class, library))
+    return issues
+
+def lint_code_isolated(code: str, file_path: str = None, timeout: float = 120) -> list[LINT_ISSUE]:
+    # lint_code on generated code, run like a testbench: in a forked child (or a
+    # fresh interpreter) with the same CPU, memory and time limits and without
+    # the provider keys in its environment
+    from basic.testbench_runner import run_test_forked
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False, encoding='utf-8') as file:
+        file.write(code)
+    args = ['--json', file.name] + (['--file-path', file_path] if file_path else [])
+    try:
+        result = run_test_forked(os.path.abspath(__file__), timeout, None, args)
+    finally:
+        os.unlink(file.name)
+
+    for line in reversed(result['stdout'].splitlines()):
+        if line.startswith(result_marker):
+            return [LINT_ISSUE(**issue) for issue in json.loads(line[len(result_marker):])]
+    if result['status'] == 'timeout':
+        message = f"loading the netlist did not finish within {timeout:g}s"
+    else:
+        lines = [line for line in result['stderr'].splitlines() if line.strip()]
+        message = lines[-1].strip() if lines else f"lint process exited with code {result['returncode']}"
+    return [LINT_ISSUE('error', 'load_error', 'generated_netlist', message)]
+
+def has_errors(issues: list[LINT_ISSUE]) -> bool:
+    return any(issue.severity == 'error' for issue in issues)
+
+def format_issues(issues: list[LINT_ISSUE]) -> str:
+    return '\n'.join(f"- {issue}" for issue in issues)
+
+
+if __name__ == '__main__':
+    # python -m basic.netlist_lint modules/*.py
+    import time
+    import argparse
+    from dataclasses import asdict
+    parser = argparse.ArgumentParser(description='Lint the netlists defined in circuit module files')
+    parser.add_argument('--json', action='store_true', help='print the issues of each file as one JSON line')
+    parser.add_argument('--file-path', help='__file__ of the code, when it is linted from a copy')
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.paths:
+        start = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as file:
+            issues = lint_code(file.read(), file_path=args.file_path or os.path.abspath(path))
+        failed = failed or has_errors(issues)
+        if args.json:
+            print(result_marker + json.dumps([asdict(issue) for issue in issues]), flush=True)
+            continue
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{path}: {len(issues)} issue(s) in {elapsed:.1f} ms")
+        for issue in issues:
+            print(f"  {issue}")
+    sys.exit(1 if failed else 0)
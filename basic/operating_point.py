@@ -0,0 +1,56 @@
+import numpy as np
+from basic.spice_pool import SPICE_POOL, get_spice_pool, render_deck, get_ngspice, load_deck, plot_vectors
+
+def alter_command(name: str, value: float) -> str:
+    # 'Vin' -> DC value of a source, 'R1.resistance' / 'M1.w' -> device parameter
+    if '.' in name:
+        device, parameter = name.rsplit('.', 1)
+        return f'alter {device.lower()} {parameter.lower()} = {value!r}'
+    return f'alter {name.lower()} dc = {value!r}'
+
+def run_operating_points(deck: str, conditions: list[dict], nodes: list[str], time_budget: float = None) -> np.ndarray:
+    # executes inside a pool worker: the circuit is parsed once and every
+    # condition is applied with alter before a fresh op, rows that fail to
+    # converge are left as NaN; with a time_budget each op is watched
+    from basic.sim_watchdog import SimulationFailure, WATCHDOG_NGSPICE
+    ngspice = get_ngspice()
+    ngspice.time_budget = time_budget
+    load_deck(ngspice, deck)
+    node_names = [node.lower() for node in nodes]
+    voltages = np.full((len(conditions), len(nodes)), np.nan)
+    try:
+        for i, condition in enumerate(conditions):
+            try:
+                for name, value in condition.items():
+                    ngspice.exec_command(alter_command(name, value))
+                # reruns the deck's .op; not through the result cache, whose key
+                # is the deck text without the alterations
+                WATCHDOG_NGSPICE.run(ngspice)
+            except NameError:
+                continue
+            except SimulationFailure as e:
+                if not e.halted:
+                    raise
+                continue
+            plot_name = ngspice.last_plot
+            if plot_name == 'const':
+                continue
+            vectors = plot_vectors(ngspice, plot_name)
+            for j, node in enumerate(node_names):
+                vector = vectors.get(node)
+                if vector is not None and vector.size:
+                    voltages[i, j] = np.real(vector[0])
+            ngspice.destroy(plot_name)
+    finally:
+        ngspice.remove_circuit()
+        ngspice.destroy()
+    return voltages
+
+def batch_operating_point(circuit, conditions: list[dict], nodes: list[str], pool: SPICE_POOL = None,
+                          temperature: float = 25, nominal_temperature: float = 25) -> np.ndarray:
+    # returns an array of shape (len(conditions), len(nodes)); alterations
+    # persist between conditions, so every condition should set each swept key
+    deck = render_deck(circuit, 'operating_point', temperature=temperature, nominal_temperature=nominal_temperature)
+    pool = pool or get_spice_pool()
+    return pool.run_job(run_operating_points, deck, list(conditions), list(nodes), pool.time_budget,
+                        analyses=max(len(conditions), 1))
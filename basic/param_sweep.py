@@ -0,0 +1,121 @@
+import os
+import glob
+import itertools
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from basic.spice_pool import SPICE_POOL, SimulationError, get_spice_pool, render_deck, run_deck
+from basic.netlist_cache import cached_subcircuit
+
+def parameter_grid(**axes) -> list[dict]:
+    # parameter_grid(channel_length=[0.18e-6, 0.35e-6], compensation_capacitor=[1e-12, 2e-12])
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*axes.values())]
+
+def _stack(rows: list, length: int) -> np.ndarray:
+    # transient runs can differ in length, pad them to a rectangle with NaN
+    dtype = np.complex128 if any(np.iscomplexobj(row) for row in rows if row is not None) else np.float64
+    stacked = np.full((len(rows), length), np.nan, dtype=dtype)
+    for i, row in enumerate(rows):
+        if row is not None:
+            stacked[i, :len(row)] = row
+    return stacked
+
+def write_shard(path: str, samples: list[dict], results: list, outputs: list[str]) -> str:
+    columns = {}
+    for name in samples[0]:
+        columns[f'param:{name}'] = np.array([sample[name] for sample in samples], dtype=np.float64)
+
+    columns['ok'] = np.array([not isinstance(result, Exception) for result in results])
+    columns['error'] = np.array([str(result) if isinstance(result, Exception) else '' for result in results])
+    for output in outputs:
+        rows = [None if isinstance(result, Exception) else result.get(output.lower()) for result in results]
+        length = max((len(row) for row in rows if row is not None), default=0)
+        columns[f'out:{output}'] = _stack(rows, length)
+
+    np.savez(path, **columns)
+    return path
+
+def run_sweep(module_class, samples: list[dict], testbench, analysis: str, analysis_params: dict,
+              outputs: list[str], out_dir: str, shard_size: int = 256, pool: SPICE_POOL = None,
+              fixed_params: dict = None, use_cache: bool = True) -> list[str]:
+    # testbench(subcircuit) builds the top-level Circuit around one sized module,
+    # e.g. the AC bench of TwoStageOpamp_Test1, and outputs are vector names to keep
+    pool = pool or get_spice_pool()
+    fixed_params = fixed_params or {}
+    os.makedirs(out_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(out_dir, 'shard_*.npz')):
+        os.remove(path)
+
+    def submit(sample):
+        try:
+            if use_cache:
+                subcircuit = cached_subcircuit(module_class, **fixed_params, **sample)
+            else:
+                subcircuit = module_class(**fixed_params, **sample)
+            circuit = testbench(subcircuit)
+            deck = render_deck(circuit, analysis, **analysis_params)
+        except Exception as e:
+            # a sample the module refuses to build is recorded like a failed simulation
+            future = Future()
+            future.set_exception(e)
+            return future
+        return pool.submit_job(run_deck, deck, pool.time_budget)
+
+    # keep only a few shards' worth of jobs in flight so memory stays bounded
+    max_in_flight = max(2 * pool.n_workers, 1)
+    pending = deque()
+    shard_samples, shard_results, shard_paths = [], [], []
+    sample_iter = iter(samples)
+
+    def flush():
+        path = os.path.join(out_dir, f'shard_{len(shard_paths):05d}.npz')
+        shard_paths.append(write_shard(path, shard_samples, shard_results, outputs))
+        shard_samples.clear()
+        shard_results.clear()
+
+    while True:
+        while len(pending) < max_in_flight:
+            sample = next(sample_iter, None)
+            if sample is None:
+                break
+            pending.append((sample, submit(sample)))
+        if not pending:
+            break
+
+        sample, future = pending.popleft()
+        try:
+            result = future.result()
+        except SimulationError as e:
+            result = e
+        except BrokenProcessPool:
+            pool.restart(only_broken=True)
+            result = SimulationError("ngspice worker crashed")
+        except Exception as e:
+            result = SimulationError(f"{e.__class__.__name__}: {e}")
+        shard_samples.append(sample)
+        shard_results.append(result)
+        if len(shard_samples) >= shard_size:
+            flush()
+
+    if shard_samples:
+        flush()
+    return shard_paths
+
+def load_sweep(out_dir: str) -> dict:
+    columns = {}
+    for path in sorted(glob.glob(os.path.join(out_dir, 'shard_*.npz'))):
+        with np.load(path) as shard:
+            for name in shard.files:
+                columns.setdefault(name, []).append(shard[name])
+
+    merged = {}
+    for name, parts in columns.items():
+        if parts[0].ndim == 2:
+            length = max(part.shape[1] for part in parts)
+            parts = [np.pad(part, ((0, 0), (0, length - part.shape[1])), constant_values=np.nan)
+                     for part in parts]
+        merged[name] = np.concatenate(parts)
+    return merged
@@ -0,0 +1,65 @@
+import os
+import re
+import threading
+
+# [Model], [InputNode], [Parameter_Des] ...; lower-case brackets such as
+# vout[low_vin_mask] in the example code are left alone
+placeholder_pattern = re.compile(r'\[([A-Z][A-Za-z0-9_]*)\]')
+
+class PROMPT_TEMPLATE:
+    def __init__(self, text: str, path: str = None):
+        self.path = path
+        self.text = text
+        # literal text at even indices, placeholder names at odd indices
+        self.parts = placeholder_pattern.split(text)
+        self.placeholders = set(self.parts[1::2])
+
+    @classmethod
+    def from_file(cls, path: str) -> 'PROMPT_TEMPLATE':
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls(file.read(), path)
+
+    def render(self, replacement: dict) -> str:
+        # one pass, substituted values are never scanned again; a placeholder
+        # without a value stays in the prompt as it is
+        parts = self.parts[:]
+        for i in range(1, len(parts), 2):
+            value = replacement.get(parts[i])
+            parts[i] = value if value is not None else f'[{parts[i]}]'
+        return ''.join(parts)
+
+    def missing(self, replacement: dict) -> set:
+        return {key for key in self.placeholders if replacement.get(key) is None}
+
+    def unused(self, replacement: dict) -> set:
+        return {key for key, value in replacement.items() if value is not None and key not in self.placeholders}
+
+
+class TEMPLATE_CACHE:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> PROMPT_TEMPLATE:
+        # recompiled whenever the file changes on disk
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+        template = PROMPT_TEMPLATE.from_file(path)
+        with self._lock:
+            self._entries[key] = (version, template)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+template_cache = TEMPLATE_CACHE()
+
+def get_template(path: str) -> PROMPT_TEMPLATE:
+    return template_cache.get(path)
@@ -0,0 +1,142 @@
+import time
+import queue
+import threading
+from collections import deque
+from basic.trace import tracer
+from basic.LLM_Interface import CANCEL_SCOPE, RequestCancelled
+
+class RaceError(RuntimeError):
+    pass
+
+
+class RACE_STATS:
+    # per provider: races entered, races won, answers rejected by the stage
+    # check, errors, and the latency of its recent complete answers
+    def __init__(self, window: int = 200):
+        self.window = window
+        self.providers = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, name: str) -> dict:
+        return self.providers.setdefault(name, {
+            'races': 0, 'wins': 0, 'rejected': 0, 'errors': 0, 'cancelled': 0,
+            'latencies': deque(maxlen=self.window),
+        })
+
+    def record(self, name: str, outcome: str, latency: float = None):
+        with self._lock:
+            entry = self._entry(name)
+            if outcome == 'entered':
+                entry['races'] += 1
+                return
+            if outcome in ('wins', 'rejected', 'errors', 'cancelled'):
+                entry[outcome] += 1
+            if latency is not None:
+                entry['latencies'].append(latency)
+
+    def latency(self, name: str, q: float = 0.95) -> float:
+        with self._lock:
+            latencies = sorted(self._entry(name)['latencies'])
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def reliability(self, name: str) -> float:
+        # share of finished answers that passed the stage check
+        with self._lock:
+            entry = self._entry(name)
+            finished = entry['wins'] + entry['rejected'] + entry['errors']
+            return entry['wins'] / finished if finished else 1.0
+
+    def fastest(self, providers: list, n: int = None, q: float = 0.95) -> list:
+        # ranked by latency over reliability, roughly the time to a usable
+        # answer; providers without any measurement go first so they get measured
+        def key(provider):
+            latency = self.latency(provider.name, q)
+            if latency is None:
+                return (False, 0.0)
+            return (True, latency / max(self.reliability(provider.name), 0.05))
+        ranked = sorted(providers, key=key)
+        return ranked[:n] if n else ranked
+
+    def summary(self) -> dict:
+        summary = {}
+        with self._lock:
+            names = list(self.providers)
+        for name in names:
+            with self._lock:
+                entry = self.providers[name]
+                races, wins = entry['races'], entry['wins']
+                counts = {k: entry[k] for k in ('rejected', 'errors', 'cancelled')}
+            summary[name] = {
+                'races': races,
+                'wins': wins,
+                'win_rate': wins / races if races else None,
+                'p50': self.latency(name, 0.5),
+                'p95': self.latency(name, 0.95),
+                **counts,
+            }
+        return summary
+
+
+race_stats = RACE_STATS()
+
+def _run_racer(provider, request: str, stage: str, accept, scope: CANCEL_SCOPE, results: queue.Queue):
+    start = time.perf_counter()
+    chunks = []
+    try:
+        for chunk in provider.get_answer_stream(request, stage = stage, cancel = scope):
+            chunks.append(chunk)
+    except RequestCancelled:
+        results.put((provider, 'cancelled', None, time.perf_counter() - start))
+        return
+    except Exception as e:
+        outcome = 'cancelled' if scope.cancelled else 'errors'
+        results.put((provider, outcome, e, time.perf_counter() - start))
+        return
+    response = ''.join(chunks)
+    latency = time.perf_counter() - start
+    try:
+        ok = accept(response)
+    except Exception:
+        ok = False
+    results.put((provider, 'valid' if ok else 'rejected', response, latency))
+
+def _drain(results: queue.Queue, remaining: int, stats: RACE_STATS):
+    # a cancelled provider was at least this slow, which keeps it ranked
+    # behind the winners instead of looking unmeasured
+    for _ in range(remaining):
+        provider, outcome, value, latency = results.get()
+        stats.record(provider.name, 'cancelled' if outcome in ('cancelled', 'valid') else outcome, latency)
+
+def race(providers: list, request: str, accept, stage: str = None, max_providers: int = None,
+         stats: RACE_STATS = race_stats) -> tuple:
+    # sends request to the (fastest max_providers of the) providers at once and
+    # returns (response, provider) of the first answer accept() is happy with
+    providers = stats.fastest(providers, max_providers)
+    scopes = {provider.name: CANCEL_SCOPE() for provider in providers}
+    results = queue.Queue()
+    with tracer.span('llm.race', stage = stage, providers = [p.name for p in providers]) as span:
+        for provider in providers:
+            stats.record(provider.name, 'entered')
+            threading.Thread(target = _run_racer, args = (provider, request, stage, accept, scopes[provider.name], results),
+                             daemon = True).start()
+
+        errors = []
+        for finished in range(1, len(providers) + 1):
+            provider, outcome, value, latency = results.get()
+            if outcome == 'valid':
+                # the losers' streams are closed now, a request still waiting in the
+                # limiter or a retry backoff is dropped before it is sent
+                for name, scope in scopes.items():
+                    if name != provider.name:
+                        scope.cancel()
+                stats.record(provider.name, 'wins', latency)
+                threading.Thread(target = _drain, args = (results, len(providers) - finished, stats),
+                                 daemon = True).start()
+                span.set(winner = provider.name, latency = latency)
+                return value, provider
+            stats.record(provider.name, outcome, latency)
+            errors.append(f"{provider.name}: {value if outcome == 'errors' else outcome}")
+        span.set(winner = None)
+    raise RaceError(f"no provider gave an acceptable answer ({'; '.join(errors)})")
@@ -0,0 +1,89 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+class TOKEN_BUCKET:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float = 1, cancel: threading.Event = None) -> bool:
+        # a single request larger than the bucket is clamped so it can still run;
+        # False when cancel was set while waiting, nothing is taken then
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.level >= amount:
+                    self.level -= amount
+                    return True
+                wait = (amount - self.level) / self.rate
+            if cancel is None:
+                time.sleep(wait)
+            elif cancel.wait(wait):
+                return False
+
+    def debit(self, amount: float):
+        # settle the difference between the estimate and the real usage, may go negative
+        with self._lock:
+            self._refill()
+            self.level -= amount
+
+
+class PROVIDER_LIMITER:
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None):
+        self.requests = TOKEN_BUCKET(requests_per_minute) if requests_per_minute else None
+        self.tokens = TOKEN_BUCKET(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, estimated_tokens: int, cancel: threading.Event = None) -> bool:
+        if self.requests is not None and not self.requests.acquire(1, cancel):
+            return False
+        if self.tokens is not None and not self.tokens.acquire(estimated_tokens, cancel):
+            if self.requests is not None:
+                # give the request slot back
+                self.requests.debit(-1)
+            return False
+        return True
+
+    def settle(self, estimated_tokens: int, used_tokens: int):
+        if self.tokens is not None and used_tokens is not None:
+            self.tokens.debit(used_tokens - estimated_tokens)
+
+
+def retry_after(headers) -> float:
+    # seconds requested by the server, from Retry-After / retry-after-ms headers
+    if headers is None:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0, server_delay: float = None) -> float:
+    # full-jitter exponential backoff, never shorter than what the server asked for
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if server_delay is not None:
+        delay = max(delay, server_delay)
+    return delay
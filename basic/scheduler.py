@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class DAG_SCHEDULER:
+    # tasks may add further tasks and dependencies while the DAG is running,
+    # a failed task only blocks the tasks that (transitively) depend on it
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.functions = {}
+        self.dependencies = {}
+        self.states = {}
+        self.results = {}
+        self.errors = {}
+        self._cond = threading.Condition()
+
+    def add_task(self, name: str, function, dependencies=()) -> bool:
+        with self._cond:
+            if name in self.functions:
+                return False
+            self.functions[name] = function
+            self.dependencies[name] = set(dependencies)
+            self.states[name] = 'pending'
+            self._cond.notify_all()
+            return True
+
+    def add_dependency(self, name: str, dependency: str):
+        with self._cond:
+            if self.states[name] != 'pending':
+                raise RuntimeError(f"Task {name} has already started")
+            self.dependencies[name].add(dependency)
+
+    def _block_dependents(self):
+        changed = True
+        while changed:
+            changed = False
+            for name, state in self.states.items():
+                if state != 'pending':
+                    continue
+                for dependency in self.dependencies[name]:
+                    if self.states.get(dependency) in ('failed', 'blocked'):
+                        self.states[name] = 'blocked'
+                        self.errors[name] = f"blocked by {dependency}"
+                        changed = True
+                        break
+
+    def _ready_tasks(self) -> list[str]:
+        return [
+            name for name, state in self.states.items()
+            if state == 'pending'
+            and all(self.states.get(dependency) == 'done' for dependency in self.dependencies[name])
+        ]
+
+    def _execute(self, name: str):
+        try:
+            result = self.functions[name]()
+        except Exception as e:
+            with self._cond:
+                self.states[name] = 'failed'
+                self.errors[name] = e
+                self._cond.notify_all()
+            return
+        with self._cond:
+            self.states[name] = 'done'
+            self.results[name] = result
+            self._cond.notify_all()
+
+    def run(self) -> dict:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            with self._cond:
+                while True:
+                    self._block_dependents()
+                    for name in self._ready_tasks():
+                        self.states[name] = 'running'
+                        executor.submit(self._execute, name)
+
+                    if not any(state == 'running' for state in self.states.values()):
+                        # whatever is still pending waits on a task that was never added
+                        for name, state in self.states.items():
+                            if state == 'pending':
+                                self.states[name] = 'blocked'
+                                missing = [d for d in self.dependencies[name] if d not in self.states]
+                                if missing:
+                                    self.errors[name] = f"missing dependency {', '.join(missing)}"
+                                else:
+                                    self.errors[name] = "blocked by unfinished dependencies"
+                        break
+                    self._cond.wait()
+        return dict(self.states)
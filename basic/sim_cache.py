@@ -0,0 +1,191 @@
+import os
+import json
+import hashlib
+import threading
+from functools import lru_cache
+
+import numpy as np
+from basic.sim_watchdog import WATCHDOG_NGSPICE
+
+# cards that select and configure the analysis rather than describe the circuit
+control_cards = ('.op', '.dc', '.ac', '.tran', '.noise', '.tf', '.sens', '.pz', '.disto',
+                 '.options', '.option', '.temp', '.save', '.probe', '.ic', '.nodeset', '.meas', '.measure')
+include_cards = ('.include', '.inc', '.lib')
+
+@lru_cache(maxsize=256)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+def file_digest(path: str) -> str:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return _file_digest(path, stat.st_mtime_ns, stat.st_size)
+
+def canonical_deck(deck: str) -> tuple[list, list]:
+    # (circuit lines, analysis lines) of a rendered deck without the title,
+    # comments, continuations and whitespace or case differences
+    lines = []
+    for line in deck.splitlines():
+        line = line.strip()
+        if not line or line.startswith('*'):
+            continue
+        if line.startswith('+') and lines:
+            lines[-1] = f"{lines[-1]} {line[1:].strip()}"
+        else:
+            lines.append(line)
+
+    circuit, analysis = [], []
+    for line in lines:
+        card = line.split(None, 1)[0].lower()
+        if card in ('.title', '.end'):
+            continue
+        if card in include_cards:
+            # file names keep their case, the key follows the included content
+            path = line.split(None, 1)[1].split()[0].strip('\'"') if ' ' in line else ''
+            circuit.append(f"{card} {path} {file_digest(path)}")
+            continue
+        line = ' '.join(line.split()).lower()
+        (analysis if card in control_cards else circuit).append(line)
+    return circuit, analysis
+
+
+class SIM_CACHE:
+    def __init__(self, cache_dir: str = './sim_cache', max_bytes: int = 1024 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # same switches as the LLM response cache
+        self.enabled = True
+        self.refresh = False
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(deck: str, simulator: str) -> str:
+        circuit, analysis = canonical_deck(deck)
+        payload = json.dumps({'circuit': circuit, 'analysis': analysis, 'simulator': simulator})
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.npz')
+
+    def get(self, key: str) -> tuple:
+        # (plot name, [(vector name, vector type, array), ...]) or None
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                vectors = [(name, vector_type, data[f'v{i}']) for i, (name, vector_type) in enumerate(meta['vectors'])]
+            # the file mtime doubles as the LRU timestamp
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return meta['plot'], vectors
+
+    def put(self, key: str, plot_name: str, vectors: list):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        meta = {'plot': plot_name, 'vectors': [[name, vector_type] for name, vector_type, _ in vectors]}
+        arrays = {f'v{i}': np.asarray(data) for i, (_, _, data) in enumerate(vectors)}
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            np.savez(file, meta=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            try:
+                scan = list(os.scandir(self.cache_dir))
+            except OSError:
+                return
+            for entry in scan:
+                if not entry.name.endswith('.npz'):
+                    continue
+                # another process may have evicted or replaced it meanwhile
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.npz'):
+                    os.remove(entry.path)
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+sim_cache = SIM_CACHE()
+# CXMT_SIM_CACHE=off simulates everything, also in test subprocesses
+if os.getenv('CXMT_SIM_CACHE', '').lower() in ('0', 'off', 'false'):
+    sim_cache.enabled = False
+
+
+class CACHED_NGSPICE(WATCHDOG_NGSPICE):
+    # answers a run of an already simulated deck from sim_cache, PySpice and
+    # run_deck read the result through last_plot and plot() as usual
+    _deck = None
+    _cached = None
+
+    def simulator_version(self) -> str:
+        import PySpice
+        return f"ngspice {self.ngspice_version}, PySpice {PySpice.__version__}"
+
+    def load_circuit(self, circuit):
+        self._deck = str(circuit)
+        self._cached = None
+        return super().load_circuit(circuit)
+
+    def run(self, background=False):
+        if background or self._deck is None or not sim_cache.enabled:
+            return super().run(background)
+        key = sim_cache.make_key(self._deck, self.simulator_version())
+        cached = None if sim_cache.refresh else sim_cache.get(key)
+        if cached is not None:
+            self._cached = cached
+            return
+        super().run()
+        plot_name = self.last_plot
+        if plot_name != 'const':
+            plot = super().plot(None, plot_name)
+            sim_cache.put(key, plot_name, [(name, int(vector._type), vector._data) for name, vector in plot.items()])
+
+    @property
+    def last_plot(self):
+        if self._cached is not None:
+            return self._cached[0]
+        return super().last_plot
+
+    def plot(self, simulation, plot_name):
+        if self._cached is None or plot_name != self._cached[0]:
+            return super().plot(simulation, plot_name)
+        from PySpice.Spice.NgSpice.Shared import Plot, Vector
+        plot = Plot(simulation, plot_name)
+        for name, vector_type, data in self._cached[1]:
+            plot[name] = Vector(self, name, self._simulation_type[vector_type], data)
+        return plot
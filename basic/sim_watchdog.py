@@ -0,0 +1,218 @@
+import os
+import re
+import sys
+import time
+import runpy
+import argparse
+import traceback
+from collections import deque
+from PySpice.Spice.NgSpice.Shared import NgSpiceShared
+from basic.spice_pool import SimulationError
+
+# failure kinds, also used as test item statuses by the testbench runner
+failure_kinds = ('non_convergence', 'timeout', 'singular_matrix', 'error')
+
+progress_pattern = re.compile(r'^\s*([\w.]+)\s*:\s*([\d.]+)\s*%')
+failure_patterns = (
+    ('singular_matrix', re.compile(r'singular matrix', re.IGNORECASE)),
+    ('non_convergence', re.compile(r'timestep too small|no convergence|gmin stepping failed|'
+                                   r'source stepping failed|iteration limit reached|too many iterations',
+                                   re.IGNORECASE)),
+)
+abort_pattern = re.compile(r'simulation\(s\) aborted|analysis .* failed|doAnalyses', re.IGNORECASE)
+abort_exit_code = 3
+
+class SimulationFailure(SimulationError):
+    def __init__(self, kind: str, message: str, log: str = '', halted: bool = True):
+        super().__init__(f"{kind}: {message}")
+        self.kind = kind
+        self.message = message
+        self.log = log
+        self.halted = halted
+
+    def __reduce__(self):
+        # failures come back from pool workers pickled
+        return self.__class__, (self.kind, self.message, self.log, self.halted)
+
+
+def classify_log(text: str) -> str:
+    # the most specific kind mentioned in the ngspice output, 'error' otherwise
+    for kind, pattern in failure_patterns:
+        if pattern.search(text):
+            return kind
+    return 'error'
+
+
+class WATCHDOG:
+    # fed by the ngspice output and progress callbacks of one analysis, check()
+    # tells when it should be given up
+    def __init__(self, time_budget: float = 30, stall_time: float = 10, max_timestep_errors: int = 3,
+                 max_singular: int = 5):
+        self.time_budget = time_budget
+        self.stall_time = stall_time
+        self.max_timestep_errors = max_timestep_errors
+        self.max_singular = max_singular
+        self.start()
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.last_advance = self.started
+        self.analysis = None
+        self.progress = None
+        self.timestep_errors = 0
+        self.singular = 0
+        self.log = deque(maxlen=50)
+
+    def on_char(self, message: str):
+        content = message.partition(' ')[2] or message
+        self.log.append(content)
+        lower = content.lower()
+        if 'timestep too small' in lower:
+            self.timestep_errors += 1
+        if 'singular matrix' in lower:
+            self.singular += 1
+
+    def on_stat(self, message: str):
+        match = progress_pattern.match(message)
+        if not match:
+            return
+        analysis, percent = match.group(1), float(match.group(2))
+        if analysis != self.analysis or self.progress is None or percent > self.progress:
+            self.analysis = analysis
+            self.progress = percent
+            self.last_advance = time.perf_counter()
+
+    def where(self) -> str:
+        if self.progress is None:
+            return ''
+        return f" at {self.analysis} {self.progress:.1f}%"
+
+    def check(self) -> tuple:
+        # (kind, message) once the analysis should be aborted, else None
+        now = time.perf_counter()
+        if self.time_budget is not None and now - self.started > self.time_budget:
+            return 'timeout', f"analysis exceeded its {self.time_budget:g}s budget{self.where()}"
+        if self.timestep_errors >= self.max_timestep_errors:
+            return 'non_convergence', f"{self.timestep_errors} 'timestep too small' events{self.where()}"
+        if self.singular >= self.max_singular:
+            return 'singular_matrix', f"{self.singular} singular matrix events{self.where()}"
+        # the timestep collapsed when simulated time stops advancing
+        if self.progress is not None and self.progress < 100 and now - self.last_advance > self.stall_time:
+            return 'non_convergence', f"no progress for {now - self.last_advance:.1f}s{self.where()}"
+        return None
+
+    def failure(self, text: str) -> tuple:
+        # (kind, message) for an analysis that ended without a usable result
+        kind = classify_log(text)
+        lines = [line for line in text.splitlines() if line.strip()]
+        return kind, (lines[-1].strip() if lines else 'simulation failed') + self.where()
+
+    def text(self) -> str:
+        return '\n'.join(self.log)
+
+
+# failures of this process, reported by the testbench bootstrap below
+failures = []
+
+def run_watched(ngspice, watchdog: WATCHDOG, poll_interval: float = 0.05, halt_grace: float = 2.0):
+    # runs the loaded circuit in the ngspice background thread so it can be halted
+    watchdog.start()
+    ngspice.run(background=True)
+    while ngspice.is_running:
+        failure = watchdog.check()
+        if failure is not None:
+            ngspice.halt()
+            deadline = time.perf_counter() + halt_grace
+            while ngspice.is_running and time.perf_counter() < deadline:
+                time.sleep(poll_interval)
+            error = SimulationFailure(*failure, log=watchdog.text(), halted=not ngspice.is_running)
+            failures.append(error)
+            raise error
+        time.sleep(poll_interval)
+
+    text = watchdog.text()
+    if ngspice.last_plot == 'const' or abort_pattern.search(text):
+        error = SimulationFailure(*watchdog.failure(text), log=text)
+        failures.append(error)
+        raise error
+
+
+class WATCHDOG_NGSPICE(NgSpiceShared):
+    # per analysis limits, time_budget = None runs analyses unwatched
+    time_budget = None
+    stall_time = 10
+    max_timestep_errors = 3
+    max_singular = 5
+
+    def send_char(self, message, ngspice_id):
+        watchdog = getattr(self, 'watchdog', None)
+        if watchdog is not None:
+            watchdog.on_char(message)
+        return 0
+
+    def send_stat(self, message, ngspice_id):
+        watchdog = getattr(self, 'watchdog', None)
+        if watchdog is not None:
+            watchdog.on_stat(message)
+        return 0
+
+    def run(self, background=False):
+        if background or self.time_budget is None:
+            return super().run(background)
+        self.watchdog = WATCHDOG(self.time_budget, self.stall_time, self.max_timestep_errors, self.max_singular)
+        run_watched(self, self.watchdog)
+
+
+def install(time_budget: float = 30, stall_time: float = 10, max_timestep_errors: int = 3, instance_class=None):
+    # every ngspice instance PySpice creates from now on is a watched one (of
+    # instance_class, a WATCHDOG_NGSPICE subclass), has to happen before the
+    # first simulation of the process
+    WATCHDOG_NGSPICE.time_budget = time_budget
+    WATCHDOG_NGSPICE.stall_time = stall_time
+    WATCHDOG_NGSPICE.max_timestep_errors = max_timestep_errors
+    NgSpiceShared.new_instance = (instance_class or WATCHDOG_NGSPICE).new_instance
+
+
+def run_script(path: str, args: list = None) -> int:
+    # runs a testbench as __main__ in this process and returns its exit code,
+    # an aborted analysis is reported on stdout even when the testbench caught it
+    sys.argv = [path] + list(args or [])
+    code = 0
+    try:
+        runpy.run_path(path, run_name='__main__')
+    except SystemExit as e:
+        if isinstance(e.code, int) or e.code is None:
+            code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    if failures:
+        failure = failures[-1]
+        print(f"Simulation_Aborted: {failure.kind}: {failure.message}", flush=True)
+        code = abort_exit_code
+        if not failure.halted:
+            # the ngspice thread is still stuck, nothing else can run in this process
+            sys.stderr.flush()
+            os._exit(code)
+    return code
+
+
+if __name__ == '__main__':
+    # python -m basic.sim_watchdog --budget 30 test_runs/Inverter_Test01.py
+    parser = argparse.ArgumentParser(description='Run a testbench script with watched ngspice analyses')
+    parser.add_argument('--budget', type=float, default=30, help='seconds per analysis')
+    parser.add_argument('--stall-time', type=float, default=10, help='seconds without simulation progress')
+    parser.add_argument('--max-timestep-errors', type=int, default=3)
+    parser.add_argument('script')
+    parser.add_argument('script_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    # this file runs as __main__, the watched instances have to come from the
+    # importable module so that testbenches and the report share one failure list
+    from basic import sim_watchdog
+    from basic.sim_cache import CACHED_NGSPICE
+    sim_watchdog.install(args.budget, args.stall_time, args.max_timestep_errors, CACHED_NGSPICE)
+    sys.exit(sim_watchdog.run_script(args.script, args.script_args))
@@ -0,0 +1,242 @@
+import os
+import time
+import pickle
+import select
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from PySpice.Spice.Simulation import CircuitSimulation
+from PySpice.Spice.NgSpice.Simulation import NgSpiceCircuitSimulator
+from basic.trace import span
+
+analysis_methods = ('operating_point', 'dc', 'ac', 'transient')
+# seconds per analysis of the shared pool, like the testbench analysis_budget
+default_time_budget = 30
+
+class SimulationError(RuntimeError):
+    pass
+
+
+class NETLIST_TEXT:
+    # lets an already rendered netlist stand in for a PySpice Circuit
+    def __init__(self, text: str):
+        lines = text.rstrip().splitlines()
+        if lines and lines[-1].strip().lower() == '.end':
+            lines.pop()
+        self.text = os.linesep.join(lines)
+
+    def str(self, simulator=None):
+        return self.text + os.linesep
+
+
+def render_deck(circuit, analysis: str = 'operating_point', temperature: float = 25,
+                nominal_temperature: float = 25, **params) -> str:
+    # circuit may be a PySpice Circuit or the text of one (without analyses),
+    # analysis=None renders the deck without any analysis card
+    if analysis is not None and analysis not in analysis_methods:
+        raise ValueError(f"Unsupported analysis: {analysis}")
+    if isinstance(circuit, str):
+        circuit = NETLIST_TEXT(circuit)
+    simulation = NgSpiceCircuitSimulator(circuit, pipe=False, temperature=temperature,
+                                         nominal_temperature=nominal_temperature)
+    if analysis is not None:
+        getattr(CircuitSimulation, analysis)(simulation, **params)
+    return str(simulation)
+
+
+# state of a worker process, the ngspice instance stays loaded between jobs
+_ngspice = None
+
+def _init_worker():
+    global _ngspice
+    from basic.sim_cache import CACHED_NGSPICE
+    _ngspice = CACHED_NGSPICE.new_instance()
+
+def get_ngspice():
+    if _ngspice is None:
+        _init_worker()
+    return _ngspice
+
+def load_deck(ngspice, deck: str):
+    ngspice.destroy()
+    try:
+        ngspice.load_circuit(deck)
+    except NameError as e:
+        raise SimulationError(f"Failed to load circuit: {e}\n{ngspice.stdout}") from None
+
+def plot_vectors(ngspice, plot_name: str) -> dict:
+    plot = ngspice.plot(None, plot_name)
+    return {name.lower(): np.array(vector._data) for name, vector in plot.items()}
+
+def run_deck(deck: str, time_budget: float = None) -> dict:
+    # vector names come back lower-cased as ngspice reports them ('vout', 'frequency', 'vdd#branch'),
+    # with a time_budget the analysis is watched and aborted with a classified SimulationFailure
+    ngspice = get_ngspice()
+    ngspice.time_budget = time_budget
+    load_deck(ngspice, deck)
+    try:
+        # a failure whose ngspice thread did not stop still propagates classified,
+        # run_isolated ends the process it ran in
+        ngspice.run()
+        plot_name = ngspice.last_plot
+        if plot_name == 'const':
+            raise SimulationError(f"Simulation failed\n{ngspice.stdout}")
+        return plot_vectors(ngspice, plot_name)
+    finally:
+        ngspice.remove_circuit()
+        ngspice.destroy()
+
+
+def run_isolated(function, args: tuple, timeout: float = None):
+    # runs in a pool worker: the job runs in a child forked from it, so a crashing
+    # ngspice or a hung analysis only ends that child and never the worker, which
+    # would break the whole ProcessPoolExecutor with every job in flight;
+    # timeout kills a child that hangs where the watchdog does not look
+    if not hasattr(os, 'fork'):
+        try:
+            return function(*args)
+        except SimulationError as e:
+            if not getattr(e, 'halted', True):
+                # the ngspice thread did not stop, the pool replaces this worker
+                os._exit(1)
+            raise
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            try:
+                outcome = (True, function(*args))
+            except BaseException as e:
+                outcome = (False, e)
+            try:
+                data = pickle.dumps(outcome)
+            except Exception as e:
+                data = pickle.dumps((False, SimulationError(f"{e.__class__.__name__}: {e}")))
+            with os.fdopen(write_fd, 'wb') as pipe:
+                pipe.write(data)
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    chunks = []
+    try:
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                from basic.sim_watchdog import SimulationFailure
+                raise SimulationFailure('timeout', f"job did not finish within {timeout:g}s")
+            readable, _, _ = select.select([read_fd], [], [], remaining)
+            if not readable:
+                continue
+            chunk = os.read(read_fd, 1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(read_fd)
+    data = b''.join(chunks)
+    _, status = os.waitpid(pid, 0)
+    if not data:
+        raise SimulationError(f"ngspice worker crashed (exit code {os.waitstatus_to_exitcode(status)})")
+    ok, value = pickle.loads(data)
+    if not ok:
+        raise value
+    return value
+
+
+class SPICE_POOL:
+    def __init__(self, n_workers: int = None, time_budget: float = None):
+        self.n_workers = n_workers or os.cpu_count()
+        # seconds per analysis, None leaves analyses unwatched
+        self.time_budget = time_budget
+        # seconds on top of the analysis budgets before a job is killed
+        self.job_grace = 30
+        # loads ngspice once per worker, the forked jobs inherit it
+        self.initializer = _init_worker
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.n_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=self.initializer
+                )
+            return self._executor
+
+    def restart(self, only_broken: bool = False):
+        # only_broken: every future of a broken executor reports it, the executor
+        # is replaced once and the replacement keeps its jobs
+        with self._lock:
+            if self._executor is not None and (not only_broken or self._executor._broken):
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def job_timeout(self, analyses: int = 1) -> float:
+        if self.time_budget is None:
+            return None
+        return analyses * self.time_budget + self.job_grace
+
+    def submit_job(self, function, *args, analyses: int = 1):
+        # runs function(*args) in a worker, function must be importable from a module;
+        # analyses: how many time_budgets the job may take
+        return self._get_executor().submit(run_isolated, function, args, self.job_timeout(analyses))
+
+    def run_job(self, function, *args, analyses: int = 1):
+        try:
+            with span('spice.run_job', job=function.__name__):
+                return self.submit_job(function, *args, analyses=analyses).result()
+        except BrokenProcessPool:
+            # a worker died outside of a job, e.g. while loading ngspice
+            self.restart(only_broken=True)
+            raise SimulationError("ngspice worker crashed") from None
+
+    def submit(self, circuit, analysis: str = 'operating_point', **params):
+        deck = render_deck(circuit, analysis, **params)
+        return self.submit_job(run_deck, deck, self.time_budget)
+
+    def simulate(self, circuit, analysis: str = 'operating_point', **params) -> dict:
+        return self.run_job(run_deck, render_deck(circuit, analysis, **params), self.time_budget)
+
+    def map(self, requests) -> list:
+        # requests: iterable of (circuit, analysis, params) tuples
+        with span('spice.map') as current:
+            futures = [self.submit(circuit, analysis, **params) for circuit, analysis, params in requests]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except BrokenProcessPool:
+                    self.restart(only_broken=True)
+                    results.append(SimulationError("ngspice worker crashed"))
+                except SimulationError as e:
+                    results.append(e)
+            current.set(jobs=len(futures), failed=sum(isinstance(r, SimulationError) for r in results))
+        return results
+
+    def close(self):
+        self.restart()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_default_pool = None
+
+def get_spice_pool() -> SPICE_POOL:
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = SPICE_POOL(time_budget=default_time_budget)
+    return _default_pool
@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+import time
+import subprocess
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from basic.circuit_model import CIRCUIT_MODEL
+from basic.trace import span
+from basic.fork_server import sandbox_environ
+
+root_dir = str(Path(__file__).parent.parent)
+
+# generated scripts resolve the repository from Path(__file__).parent.parent,
+# so they have to live one directory below the root
+run_dir = os.path.join(root_dir, 'test_runs')
+
+metric_pattern = re.compile(
+    r'^\s*([A-Za-z][\w\s\-/().]*?)\s*[:=]\s*'
+    r'([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([A-Za-z°%]*)\s*$',
+    re.MULTILINE
+)
+# printed by the basic.sim_watchdog bootstrap when it gave up on an analysis
+aborted_pattern = re.compile(r'^Simulation_Aborted: (\w+):', re.MULTILINE)
+
+@dataclass
+class TEST_RESULT:
+    model_name: str = None
+    index: int = None
+    description: str = None
+    status: str = None
+    duration: float = None
+    returncode: int = None
+    stdout: str = None
+    stderr: str = None
+    metrics: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def extract_metrics(output: str) -> dict:
+    # "DC Gain: 42.1 dB" -> {'DC Gain (dB)': 42.1}
+    metrics = {}
+    for m in metric_pattern.finditer(output):
+        name = ' '.join(m.group(1).split())
+        if m.group(3):
+            name = f"{name} ({m.group(3)})"
+        metrics[name] = float(m.group(2))
+    return metrics
+
+def classify_output(returncode: int, stdout: str) -> str:
+    # an aborted analysis says more than the Test_Failed the testbench may print after it
+    aborted = aborted_pattern.search(stdout)
+    if aborted:
+        return aborted.group(1)
+    if 'Test_Failed' in stdout:
+        return 'failed'
+    if returncode != 0:
+        return 'error'
+    if 'Test_Passed' in stdout:
+        return 'passed'
+    return 'unknown'
+
+def write_test_file(model_name: str, index: int, code: str) -> str:
+    os.makedirs(run_dir, exist_ok=True)
+    path = os.path.join(run_dir, f'{model_name}_Test{index + 1:02d}.py')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(code)
+    return path
+
+def run_test_file(path: str, timeout: float = 120, analysis_budget: float = None, args: list = None) -> dict:
+    # timeout bounds the whole script, analysis_budget each ngspice analysis in it
+    env = sandbox_environ(MPLBACKEND='Agg')
+    command = [sys.executable, path]
+    if analysis_budget is not None:
+        command = [sys.executable, '-m', 'basic.sim_watchdog', '--budget', str(analysis_budget), path]
+    command += list(args or [])
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=root_dir,
+            env=env,
+            timeout=timeout
+        )
+        returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+        status = classify_output(returncode, stdout)
+    except subprocess.TimeoutExpired as e:
+        returncode = None
+        stdout = e.stdout.decode(errors='replace') if isinstance(e.stdout, bytes) else (e.stdout or '')
+        stderr = e.stderr.decode(errors='replace') if isinstance(e.stderr, bytes) else (e.stderr or '')
+        status = 'timeout'
+    return {
+        'status': status,
+        'duration': time.perf_counter() - start,
+        'returncode': returncode,
+        'stdout': stdout,
+        'stderr': stderr,
+    }
+
+def run_test_forked(path: str, timeout: float = 120, analysis_budget: float = None, args: list = None) -> dict:
+    # forks the item from a template process that has PySpice, NumPy, matplotlib and
+    # modules/ loaded already, falls back to a fresh interpreter where that is not possible
+    from basic.fork_server import FORK_SERVER, ForkServerError, get_fork_server
+    if FORK_SERVER.available():
+        try:
+            return get_fork_server().run(path, timeout, analysis_budget, args)
+        except ForkServerError as e:
+            print(f"Fork server unavailable, running {os.path.basename(path)} in a new interpreter: {e}")
+    return run_test_file(path, timeout, analysis_budget, args)
+
+def _run_item(model_name: str, index: int, code: str, description: str, timeout: float,
+              analysis_budget: float = None, fork: bool = False) -> TEST_RESULT:
+    result = TEST_RESULT(model_name=model_name, index=index, description=description)
+    if not code:
+        result.status = 'error'
+        result.stderr = 'No test code was extracted for this item'
+        result.duration = 0.0
+        return result
+
+    with span('testbench.run_item', model=model_name, item=index) as current:
+        path = write_test_file(model_name, index, code)
+        run = run_test_forked if fork else run_test_file
+        outcome = run(path, timeout, analysis_budget)
+        current.set(status=outcome['status'])
+    result.__dict__.update(outcome)
+    result.metrics = extract_metrics(outcome['stdout'])
+    return result
+
+def _rejected_item(model_name: str, index: int, description: str, issues: str) -> TEST_RESULT:
+    return TEST_RESULT(model_name=model_name, index=index, description=description, status='rejected',
+                       duration=0.0, stderr=f"Netlist failed the lint checks:\n{issues}")
+
+def run_model_tests(models, timeout: float = 120, max_workers: int = None, lint: bool = True,
+                    analysis_budget: float = 30, fork: bool = True) -> list[TEST_RESULT]:
+    # every test item runs in its own process (forked from the warm template unless fork=False),
+    # the pool only bounds how many run at once;
+    # items of a model whose netlist has lint errors are rejected without simulating
+    if isinstance(models, CIRCUIT_MODEL):
+        models = [models]
+
+    items = []
+    for model in models:
+        rejected = None
+        if lint and model.netlist:
+            from basic.netlist_lint import lint_code_isolated, has_errors, format_issues
+            issues = lint_code_isolated(model.netlist, timeout=timeout)
+            if has_errors(issues):
+                rejected = format_issues(issues)
+        descriptions = model.testDescription or []
+        for index, code in enumerate(model.testcode or []):
+            description = descriptions[index] if index < len(descriptions) else None
+            items.append((model.model_name, index, code, description, rejected))
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = [executor.submit(_run_item, *item[:4], timeout, analysis_budget, fork) if item[4] is None
+                   else None for item in items]
+        return [future.result() if future is not None else _rejected_item(*item[:2], item[3], item[4])
+                for item, future in zip(items, futures)]
+
+def summarize_results(results: list[TEST_RESULT]) -> dict:
+    summary = {}
+    for result in results:
+        counts = summary.setdefault(result.model_name, {})
+        counts[result.status] = counts.get(result.status, 0) + 1
+    return summary
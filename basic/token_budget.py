@@ -0,0 +1,174 @@
+import re
+import math
+import threading
+from functools import lru_cache
+from basic.markdown_index import MARKDOWN_INDEX
+from basic.prompt_template import PROMPT_TEMPLATE
+
+# ASCII words, or any single other non-space character (CJK, punctuation)
+token_pattern = re.compile(r'[A-Za-z0-9_]+|[^\sA-Za-z0-9_]')
+# where the few-shot example of every prompt ends and the real input starts
+example_end_marker = 'Here is the specific input'
+
+class TOKEN_COUNTER:
+    # BPE-like estimate (about 4 characters per word piece, one token per CJK
+    # character or symbol), rescaled with the prompt_tokens the provider reports
+    def __init__(self, scale: float = 1.0, smoothing: float = 0.2):
+        self.scale = scale
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def raw_count(text: str) -> int:
+        count = 0
+        for piece in token_pattern.findall(text):
+            count += (len(piece) + 3) // 4
+        return count
+
+    def count(self, text: str) -> int:
+        return math.ceil(self.raw_count(text) * self.scale)
+
+    def calibrate(self, text: str, prompt_tokens: int):
+        raw = self.raw_count(text)
+        if raw == 0 or not prompt_tokens:
+            return
+        with self._lock:
+            self.scale += self.smoothing * (prompt_tokens / raw - self.scale)
+
+
+class USAGE_LOG:
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, stage: str, prompt_tokens: int, completion_tokens: int,
+               estimated_prompt_tokens: int = None, cached: bool = False):
+        with self._lock:
+            self.records.append({
+                'provider': provider,
+                'model': model,
+                'stage': stage,
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'estimated_prompt_tokens': estimated_prompt_tokens,
+                'cached': cached,
+            })
+
+    def summary(self) -> dict:
+        # totals per (model, stage); cached answers are counted as calls but cost nothing
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            total = totals.setdefault((record['model'], record['stage']), {
+                'calls': 0, 'cached': 0, 'prompt_tokens': 0, 'completion_tokens': 0
+            })
+            total['calls'] += 1
+            total['cached'] += int(record['cached'])
+            total['prompt_tokens'] += record['prompt_tokens'] or 0
+            total['completion_tokens'] += record['completion_tokens'] or 0
+        return totals
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+
+token_usage = USAGE_LOG()
+
+
+class PromptTooLongError(ValueError):
+    pass
+
+def strip_code_comments(code: str) -> str:
+    # drops comments and blank lines from python code, string literals are kept as they are
+    import io
+    import tokenize
+
+    try:
+        tokens = [token for token in tokenize.generate_tokens(io.StringIO(code).readline)
+                  if token.type != tokenize.COMMENT]
+        code = tokenize.untokenize(tokens)
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        code = re.sub(r'^\s*#.*$', '', code, flags=re.MULTILINE)
+    return '\n'.join(line.rstrip() for line in code.splitlines() if line.strip())
+
+def summarize_parameters(description: str) -> str:
+    # "- name: first sentence" for every parameter line, the rest is dropped
+    lines = []
+    for line in description.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        head, _, rest = line.partition(':')
+        if rest:
+            sentence = re.split(r'(?<=[.;])\s', rest.strip(), maxsplit=1)[0]
+            lines.append(f"{head}: {sentence}")
+        else:
+            lines.append(line)
+    return '\n'.join(lines)
+
+@lru_cache(maxsize=64)
+def shorten_examples(text: str, keep_lines: int) -> PROMPT_TEMPLATE:
+    # keeps the first keep_lines lines of every fenced block in the few-shot
+    # example; the headings stay so the expected answer format is still shown
+    example_end = text.find(example_end_marker)
+    if example_end < 0:
+        return PROMPT_TEMPLATE(text)
+    parts = []
+    position = 0
+    for fence in MARKDOWN_INDEX(text[:example_end]).fences:
+        content_start = text.index('\n', fence.start) + 1
+        content_end = content_start + len(fence.content)
+        lines = fence.content.splitlines(keepends=True)
+        if len(lines) <= keep_lines + 1:
+            continue
+        parts.append(text[position:content_start])
+        parts.extend(lines[:keep_lines])
+        parts.append('...\n')
+        position = content_end
+    parts.append(text[position:])
+    return PROMPT_TEMPLATE(''.join(parts))
+
+def _strip_model_code(template: PROMPT_TEMPLATE, replacement: dict):
+    if replacement.get('ModelCode'):
+        replacement = dict(replacement, ModelCode=strip_code_comments(replacement['ModelCode']))
+    return template, replacement
+
+def _summarize_parameter_des(template: PROMPT_TEMPLATE, replacement: dict):
+    if replacement.get('Parameter_Des'):
+        replacement = dict(replacement, Parameter_Des=summarize_parameters(replacement['Parameter_Des']))
+    return template, replacement
+
+def _shorten_examples(template: PROMPT_TEMPLATE, replacement: dict):
+    return shorten_examples(template.text, 12), replacement
+
+def _drop_example_code(template: PROMPT_TEMPLATE, replacement: dict):
+    return shorten_examples(template.text, 0), replacement
+
+# applied in order, each one on top of the previous, until the prompt fits
+compaction_steps = [
+    ('strip ModelCode comments', _strip_model_code),
+    ('summarize Parameter_Des', _summarize_parameter_des),
+    ('shorten examples', _shorten_examples),
+    ('drop example code', _drop_example_code),
+]
+
+def fit_prompt(template: PROMPT_TEMPLATE, replacement: dict, counter: TOKEN_COUNTER, budget: int,
+               suffix: str = '') -> tuple:
+    # returns (prompt, token count, names of the compaction steps applied)
+    prompt = template.render(replacement) + suffix
+    tokens = counter.count(prompt)
+    applied = []
+    for name, step in compaction_steps:
+        if budget is None or tokens <= budget:
+            break
+        template, replacement = step(template, replacement)
+        compacted = template.render(replacement) + suffix
+        compacted_tokens = counter.count(compacted)
+        if compacted_tokens < tokens:
+            prompt, tokens = compacted, compacted_tokens
+            applied.append(name)
+    if budget is not None and tokens > budget:
+        raise PromptTooLongError(f"prompt needs {tokens} tokens after compaction, budget is {budget}")
+    return prompt, tokens, applied
@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+class SPAN:
+    __slots__ = ('name', 'span_id', 'parent_id', 'start', 'duration', 'attributes', 'error')
+
+    def __init__(self, name: str, span_id: int, parent_id: int, attributes: dict):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.duration = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration': self.duration,
+            'thread': threading.current_thread().name,
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+class TRACER:
+    # finished spans are kept in memory (bounded) and, once export() has been
+    # called, appended to a JSONL file as they finish
+    def __init__(self, max_spans: int = 100000):
+        self.enabled = True
+        self.spans = deque(maxlen=max_spans)
+        self.export_path = None
+        self._file = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _new_id(self) -> int:
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            yield SPAN(name, None, None, attributes)
+            return
+        stack = self._stack()
+        span = SPAN(name, self._new_id(), stack[-1].span_id if stack else None, attributes)
+        stack.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{e.__class__.__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter() - start
+            stack.pop()
+            self._finish(span)
+
+    def record(self, name: str, start: float, duration: float, **attributes):
+        # for work that cannot sit inside a with block, e.g. a streaming generator
+        if not self.enabled:
+            return
+        stack = self._stack()
+        span = SPAN(name, self._new_id(), stack[-1].span_id if stack else None, attributes)
+        span.start = start
+        span.duration = duration
+        self._finish(span)
+
+    def current(self) -> SPAN:
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def _finish(self, span: SPAN):
+        record = span.to_dict()
+        with self._lock:
+            self.spans.append(record)
+            if self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                self._file.flush()
+
+    def export(self, path: str):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+            self.export_path = path
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = None
+            self.export_path = None
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+
+tracer = TRACER()
+# CXMT_TRACE=traces/run.jsonl streams every span of a run to that file
+if os.getenv('CXMT_TRACE'):
+    tracer.export(os.getenv('CXMT_TRACE'))
+
+def span(name: str, **attributes):
+    return tracer.span(name, **attributes)
+
+def traced(name: str = None):
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def load_trace(path: str) -> list[dict]:
+    spans = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                spans.append(json.loads(line))
+    return spans
+
+def percentile(sorted_values: list, q: float) -> float:
+    # linear interpolation between closest ranks
+    if not sorted_values:
+        return float('nan')
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def summarize_spans(spans, group_by: str = 'stage') -> dict:
+    # latency statistics per span name, split by the group_by attribute when present
+    groups = {}
+    for record in spans:
+        if record.get('duration') is None:
+            continue
+        attributes = record.get('attributes') or {}
+        key = record['name']
+        if attributes.get(group_by) is not None:
+            key = f"{key} [{attributes[group_by]}]"
+        group = groups.setdefault(key, {'durations': [], 'errors': 0, 'cached': 0,
+                                        'prompt_tokens': 0, 'completion_tokens': 0, 'ttft': []})
+        group['durations'].append(record['duration'])
+        group['errors'] += int(record.get('error') is not None)
+        group['cached'] += int(bool(attributes.get('cached')))
+        group['prompt_tokens'] += attributes.get('prompt_tokens') or 0
+        group['completion_tokens'] += attributes.get('completion_tokens') or 0
+        if attributes.get('time_to_first_token') is not None:
+            group['ttft'].append(attributes['time_to_first_token'])
+
+    summary = {}
+    for key, group in groups.items():
+        durations = sorted(group['durations'])
+        ttft = sorted(group['ttft'])
+        summary[key] = {
+            'count': len(durations),
+            'total': sum(durations),
+            'p50': percentile(durations, 0.5),
+            'p90': percentile(durations, 0.9),
+            'p99': percentile(durations, 0.99),
+            'max': durations[-1],
+            'errors': group['errors'],
+            'cached': group['cached'],
+            'prompt_tokens': group['prompt_tokens'],
+            'completion_tokens': group['completion_tokens'],
+            'ttft_p50': percentile(ttft, 0.5) if ttft else None,
+        }
+    return summary
+
+def print_summary(spans, group_by: str = 'stage'):
+    summary = summarize_spans(spans, group_by)
+    print(f"{'Span':<48}{'Count':>7}{'Total (s)':>11}{'p50 (ms)':>10}{'p90 (ms)':>10}"
+          f"{'p99 (ms)':>10}{'Max (ms)':>10}{'Err':>5}{'Cached':>8}{'Tokens in/out':>16}{'TTFT p50':>10}")
+    for key, row in sorted(summary.items(), key=lambda item: item[1]['total'], reverse=True):
+        tokens = f"{row['prompt_tokens']}/{row['completion_tokens']}" if row['prompt_tokens'] else '-'
+        ttft = f"{row['ttft_p50'] * 1000:.0f}" if row['ttft_p50'] is not None else '-'
+        print(f"{key:<48}{row['count']:>7}{row['total']:>11.2f}{row['p50'] * 1000:>10.1f}"
+              f"{row['p90'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}{row['max'] * 1000:>10.1f}"
+              f"{row['errors']:>5}{row['cached']:>8}{tokens:>16}{ttft:>10}")
+
+
+if __name__ == '__main__':
+    # python -m basic.trace traces/run.jsonl [group_by]
+    if len(sys.argv) < 2:
+        print("usage: python -m basic.trace <trace.jsonl> [group_by]")
+        sys.exit(1)
+    print_summary(load_trace(sys.argv[1]), *sys.argv[2:3])
@@ -0,0 +1,85 @@
+import sys
+import re
+import subprocess
+from pathlib import Path
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+# startup budget per module in milliseconds (cumulative import time reported by -X importtime),
+# only modules that import in a fresh checkout
+import_budgets = {
+    'CXMT_Circuit': 100,
+    'basic.circuit_model': 50,
+    'basic.LLM_Interface': 50,
+    'basic.markdown_index': 20,
+    'basic.prompt_template': 20,
+    'basic.token_budget': 20,
+    'basic.scheduler': 20,
+    'TwoStageOpamp_Test1': 3000,
+}
+
+import_line = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$')
+
+def measure_import(module: str, repeat: int = 5):
+    # best of several fresh interpreters, in milliseconds
+    code = f"import sys; sys.path[:0] = [{root_dir!r}, {str(Path(root_dir) / 'testbench')!r}]; import {module}"
+    best = None
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            cwd=root_dir
+        )
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+
+        cumulative = None
+        for line in result.stderr.splitlines():
+            match = import_line.match(line)
+            if match and match.group(4) == module and match.group(3) == ' ':
+                cumulative = int(match.group(2)) / 1000
+        if cumulative is not None and (best is None or cumulative < best):
+            best = cumulative
+    return best, None
+
+def check_lazy_state():
+    # importing the pipeline must not build provider clients or scan model_json/
+    code = (
+        f"import sys; sys.path.insert(0, {root_dir!r}); import CXMT_Circuit; "
+        "print(CXMT_Circuit._all_models is None and CXMT_Circuit.LLM_model.client is None)"
+    )
+    result = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, text=True, cwd=root_dir)
+    return result.stdout.strip() == 'True'
+
+def run_benchmark(budgets: dict = import_budgets, repeat: int = 5) -> int:
+    # exit code: 0 all within budget, 1 over budget, 2 a module failed to import
+    over_budget = False
+    import_errors = False
+    print(f"{'Module':<28}{'Import (ms)':>12}{'Budget (ms)':>13}  Status")
+    for module, budget in budgets.items():
+        elapsed, error = measure_import(module, repeat)
+        if error is not None:
+            status = f"IMPORT ERROR ({error})"
+            import_errors = True
+        elif elapsed is None:
+            status = "IMPORT ERROR (no importtime entry)"
+            import_errors = True
+        elif elapsed > budget:
+            status = "OVER BUDGET"
+            over_budget = True
+        else:
+            status = "OK"
+        elapsed_text = f"{elapsed:.1f}" if elapsed is not None else "-"
+        print(f"{module:<28}{elapsed_text:>12}{budget:>13}  {status}")
+
+    lazy = check_lazy_state()
+    print(f"\nLazy clients and model set: {'OK' if lazy else 'FAILED'}")
+    if import_errors:
+        print("Some modules failed to import, their startup time was not measured")
+        return 2
+    return 0 if lazy and not over_budget else 1
+
+if __name__ == '__main__':
+    sys.exit(run_benchmark())
@@ -0,0 +1,326 @@
+import sys
+import os
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+from basic.circuit_model import load_all_models
+from basic.markdown_index import MARKDOWN_INDEX
+from basic.token_budget import TOKEN_COUNTER
+
+# the first heading of every prompt template tells the stub which stage is asking
+stage_titles = {
+    'Requirement Parsing': 'Requirement_Parsing',
+    'SubModel Generate Prompt': 'Generate_Circuit',
+    'Module Functionality Test Prompt': 'Check_Promblems',
+    'Submodule Connect': 'Submodule_Connect',
+}
+log_stages = {
+    'Top Circuit Generate': 'Requirement_Parsing',
+    'PySpice Module Generation': 'Generate_Circuit',
+    'Submodule Connect': 'Submodule_Connect',
+}
+input_marker = 'Here is the specific input'
+model_line = re.compile(r'^Model:\s*(\S+)', re.MULTILINE)
+class_line = re.compile(r'^class\s+(\w+)\(SubCircuitFactory\)', re.MULTILINE)
+log_section = re.compile(r'^##\s*\d+\.\s*(.*?)\s+(Input|Output)\s*$', re.MULTILINE)
+bold_heading = re.compile(r'^\*\*([A-Za-z_ ]+?)\s*(\d+)?\*\*\s*$', re.MULTILINE)
+
+def request_stage(prompt: str) -> tuple:
+    # (stage, model name) of a rendered prompt
+    first_line = prompt.lstrip().split('\n', 1)[0].lstrip('#').strip()
+    stage = stage_titles.get(first_line)
+    specific = prompt[prompt.find(input_marker):] if input_marker in prompt else prompt
+    match = model_line.search(specific)
+    return stage, match.group(1) if match else None
+
+
+def generate_circuit_response(netlist: str, parameter_description: str) -> str:
+    return (f"### Component Selection\n\nAs required by the problem.\n\n"
+            f"### NetList Code\n\n```python\n{netlist.strip()}\n```\n\n"
+            f"### Parameter Explanation\n\n```markdown\n{(parameter_description or '').strip()}\n```\n")
+
+def check_problems_response(testcode: list, descriptions: list) -> str:
+    parts = ["### Test Item Code\n"]
+    for i, code in enumerate(testcode):
+        description = descriptions[i] if descriptions and i < len(descriptions) else ''
+        parts.append(f"#### Test_Item {i + 1:02d}\n\n```markdown\n{description}\n```\n\n```python\n{code}\n```\n")
+    return '\n'.join(parts)
+
+def requirement_parsing_response(modules: list) -> str:
+    parts = ["### Model Description\n\nAs given above.\n"]
+    for i, (name, description, inputnode, outputnode) in enumerate(modules):
+        parts.append(f"#### Module {i + 1:02d}\n\nModel: {name}\nDescription: {description}\n"
+                     f"Input Nodes: {inputnode}\nOutput Nodes: {outputnode}\n")
+    return '\n'.join(parts)
+
+def submodule_connect_response(code: str) -> str:
+    return f"## Topology\n\n```python\n{code.strip()}\n```\n"
+
+
+def normalize_log_output(stage: str, text: str) -> str:
+    # log.md predates the heading format the extractors expect: **Module 01**,
+    # **Code_Generation** and friends become markdown headings
+    def heading(match):
+        title, number = match.group(1).strip(), match.group(2)
+        if title == 'Module':
+            return f"#### Module {number}"
+        if title == 'Code_Generation':
+            return "### NetList Code"
+        if title == 'Parameter_Explanation':
+            return "### Parameter Explanation"
+        if title == 'Topology':
+            return "## Topology"
+        return f"### {title.replace('_', ' ')}" + (f" {number}" if number else '')
+    text = bold_heading.sub(heading, text)
+    text = re.sub(r'(### Parameter Explanation\s*)```python', r'\1```markdown', text)
+    if stage == 'Submodule_Connect' and '## Topology' not in text:
+        text = text.replace('```python', '## Topology\n\n```python', 1)
+    return text
+
+def load_log_recordings(path: str) -> tuple:
+    # returns ({(stage, model): response}, {module name: module fields}) from log.md
+    recordings = {}
+    modules = {}
+    if not os.path.exists(path):
+        return recordings, modules
+    with open(path, 'r', encoding='utf-8') as file:
+        text = file.read()
+    sections = list(log_section.finditer(text))
+    inputs = {}
+    for i, match in enumerate(sections):
+        end = sections[i + 1].start() if i + 1 < len(sections) else len(text)
+        title, kind = match.group(1).replace('.', '').strip(), match.group(2)
+        body = text[match.end():end]
+        stage = log_stages.get(title)
+        if stage is None:
+            continue
+        response = normalize_log_output(stage, body)
+        # module fields are also taken from the worked examples in the inputs
+        for block in MARKDOWN_INDEX(response).module_blocks():
+            modules.setdefault(block[0], block)
+        if kind == 'Input':
+            inputs[stage] = body
+            continue
+        if stage == 'Requirement_Parsing':
+            names = model_line.findall(inputs.get(stage, ''))
+            model = names[-1] if names else None
+        else:
+            match = class_line.search(response)
+            model = match.group(1) if match else None
+        if model is not None:
+            recordings[(stage, model)] = response
+    return recordings, modules
+
+def load_module_recordings(modules_dir: str) -> dict:
+    recordings = {}
+    for path in sorted(Path(modules_dir).glob('*.py')):
+        code = path.read_text(encoding='utf-8')
+        match = class_line.search(code)
+        if match is None:
+            continue
+        signature = re.search(r'def __init__\(self,?(.*?)\):', code, re.DOTALL)
+        parameters = []
+        if signature:
+            for argument in signature.group(1).split(','):
+                name = argument.split('=')[0].strip()
+                if name:
+                    parameters.append(f"- {name}: {name.replace('_', ' ')} of the {match.group(1)} module.")
+        recordings[('Generate_Circuit', match.group(1))] = generate_circuit_response(code, '\n'.join(parameters))
+    return recordings
+
+def load_recordings(root: str = root_dir) -> dict:
+    # log.md first, then modules/ and model_json/ which are in the current format
+    recordings, modules = load_log_recordings(os.path.join(root, 'log.md'))
+    recordings.update(load_module_recordings(os.path.join(root, 'modules')))
+    for name, model in load_all_models(os.path.join(root, 'model_json')).items():
+        if model.netlist and model.submodel_names:
+            recordings[('Submodule_Connect', name)] = submodule_connect_response(model.netlist)
+        elif model.netlist:
+            recordings[('Generate_Circuit', name)] = generate_circuit_response(model.netlist, model.parameter_description)
+        if model.testcode:
+            recordings[('Check_Promblems', name)] = check_problems_response(model.testcode, model.testDescription)
+        if model.submodel_names:
+            blocks = [modules.get(sub, (sub, f"{sub} of {name}", 'Vin, VDD, VSS', 'Vout'))
+                      for sub in model.submodel_names]
+            recordings[('Requirement_Parsing', name)] = requirement_parsing_response(blocks)
+    return recordings
+
+
+# stand-ins for stage/model pairs nothing was recorded for, small but well formed
+def fallback_response(stage: str, model: str) -> str:
+    model = model or 'Module'
+    if stage == 'Requirement_Parsing':
+        return requirement_parsing_response([
+            (f"{model}Core", f"Core stage of {model}", 'Vin, VDD, VSS', 'Vmid'),
+            (f"{model}Output", f"Output stage of {model}", 'Vmid, VDD, VSS', 'Vout'),
+        ])
+    if stage == 'Submodule_Connect':
+        return submodule_connect_response(
+            f"class {model}(SubCircuitFactory):\n    NAME = '{model}'\n    NODES = ('Vin', 'Vout', 'VDD', 'VSS')\n"
+        )
+    if stage == 'Check_Promblems':
+        code = (
+            "from PySpice.Spice.Netlist import Circuit\nfrom PySpice.Unit import *\n\n"
+            "circuit = Circuit('divider')\ncircuit.V('dd', 'VDD', circuit.gnd, 5@u_V)\n"
+            "circuit.R(1, 'VDD', 'out', 1@u_kOhm)\ncircuit.R(2, 'out', circuit.gnd, 1@u_kOhm)\n"
+            "analysis = circuit.simulator(temperature=25, nominal_temperature=25).operating_point()\n"
+            "vout = float(analysis.nodes['out'][0])\n"
+            "print('Test_Passed' if abs(vout - 2.5) < 1e-3 else 'Test_Failed', f'vout={vout}')\n"
+        )
+        return check_problems_response([code], [f"Operating point of a divider standing in for {model}"])
+    return generate_circuit_response(
+        f"from PySpice.Unit import *\nfrom PySpice.Spice.Netlist import SubCircuitFactory\n\n"
+        f"class {model}(SubCircuitFactory):\n    NAME = '{model}'\n    NODES = ('Vin', 'Vout', 'VDD', 'VSS')\n\n"
+        f"    def __init__(self, r_load=10e3):\n        super().__init__()\n"
+        f"        self.R('load', 'VDD', 'Vout', r_load)\n        self.R('in', 'Vin', 'Vout', r_load)\n",
+        "- r_load: load resistance."
+    )
+
+
+class LLM_STUB:
+    # OpenAI-compatible /chat/completions that replays recordings; latency is
+    # the delay before the first token, chunk_interval the delay between chunks
+    # (also charged to non-streaming answers so both modes take as long)
+    def __init__(self, recordings: dict = None, latency: float = 0.0, jitter: float = 0.0,
+                 chunk_size: int = 64, chunk_interval: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.recordings = load_recordings() if recordings is None else recordings
+        self.latency = latency
+        self.jitter = jitter
+        self.chunk_size = chunk_size
+        self.chunk_interval = chunk_interval
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def answer(self, prompt: str) -> str:
+        stage, model = request_stage(prompt)
+        response = self.recordings.get((stage, model))
+        with self._lock:
+            self.requests += 1
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response if response is not None else fallback_response(stage, model)
+
+    def first_token_delay(self) -> float:
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def _handler(self):
+        stub = self
+        counter = TOKEN_COUNTER()
+
+        class HANDLER(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if not self.path.endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'message': f"unknown path {self.path}"}})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length) or b'{}')
+                prompt = (request.get('messages') or [{}])[-1].get('content') or ''
+                response = stub.answer(prompt)
+                chunks = [response[i:i + stub.chunk_size] for i in range(0, len(response), stub.chunk_size)]
+                usage = {'prompt_tokens': counter.raw_count(prompt), 'completion_tokens': counter.raw_count(response)}
+                usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+                model = request.get('model', 'stub')
+                created = int(time.time())
+
+                time.sleep(stub.first_token_delay())
+                if not request.get('stream'):
+                    time.sleep(stub.chunk_interval * max(0, len(chunks) - 1))
+                    self._send_json(200, {
+                        'id': f"stub-{created}", 'object': 'chat.completion', 'created': created, 'model': model,
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': response},
+                                     'finish_reason': 'stop'}],
+                        'usage': usage,
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+
+                def event(choices, **extra):
+                    payload = {'id': f"stub-{created}", 'object': 'chat.completion.chunk', 'created': created,
+                               'model': model, 'choices': choices, **extra}
+                    self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        time.sleep(stub.chunk_interval)
+                    event([{'index': 0, 'delta': {'content': chunk}, 'finish_reason': None}])
+                event([{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+                if (request.get('stream_options') or {}).get('include_usage'):
+                    event([], usage=usage)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return HANDLER
+
+    def start(self) -> 'LLM_STUB':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='OpenAI-compatible stub that replays recorded responses')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds before the first token')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--chunk-size', type=int, default=64, help='characters per streamed chunk')
+    parser.add_argument('--chunk-interval', type=float, default=0.01, help='seconds between chunks')
+    args = parser.parse_args()
+
+    stub = LLM_STUB(latency=args.latency, jitter=args.jitter, chunk_size=args.chunk_size,
+                    chunk_interval=args.chunk_interval, host=args.host, port=args.port)
+    print(f"Serving {len(stub.recordings)} recorded responses at {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
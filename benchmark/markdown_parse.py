@@ -0,0 +1,112 @@
+import sys
+import os
+import re
+import json
+import glob
+import time
+from pathlib import Path
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+
+from basic.markdown_index import MARKDOWN_INDEX
+
+# the regex extractors CXMT_Circuit used before the markdown index, kept for comparison
+def legacy_extract_code(text: str, segment_leader: str, code_leader: str):
+    pattern = re.compile(
+        r'###\s+' + re.escape(segment_leader) + r'\s*' +
+        r'```' + re.escape(code_leader) + r'\n(.*?)```',
+        re.DOTALL
+    )
+    match = pattern.search(text)
+    return match.group(1).strip() if match else None
+
+def legacy_extract_test_items(text: str):
+    pattern = r'####\s+(Test_Item\s+\d+)(.*?)(?=#### Test_Item|\Z)'
+    items = []
+    for match in re.finditer(pattern, text, re.DOTALL):
+        content = match.group(2).strip()
+        markdown = re.search(r'```markdown\n(.*?)```', content, re.DOTALL)
+        python = re.search(r'```python\n(.*?)```', content, re.DOTALL)
+        items.append((python.group(1).strip() if python else None,
+                      markdown.group(1).strip() if markdown else None))
+    return items
+
+def legacy_extract_submodels(text: str):
+    pattern = re.compile(
+        r'####\s+Module\s+\d+\s*\n'
+        r'Model:\s*(.*?)\s*\n'
+        r'Description:\s*(.*?)\s*\n'
+        r'Input\s+Nodes:\s*(.*?)\s*\n'
+        r'Output\s+Nodes:\s*(.*?)\s*(?=\n##|$)',
+        re.DOTALL | re.IGNORECASE
+    )
+    return [tuple(group.strip() for group in m.groups()) for m in pattern.finditer(text)]
+
+def legacy_all(text: str):
+    return (
+        legacy_extract_code(text, 'NetList Code', 'python'),
+        legacy_extract_code(text, 'Parameter Explanation', 'markdown'),
+        legacy_extract_code(text, 'Topology', 'python'),
+        legacy_extract_test_items(text),
+        legacy_extract_submodels(text),
+    )
+
+def indexed_all(text: str):
+    index = MARKDOWN_INDEX(text)
+    return (
+        index.code_block('NetList Code', 'python'),
+        index.code_block('Parameter Explanation', 'markdown'),
+        index.code_block('Topology', 'python'),
+        index.test_items(),
+        index.module_blocks(),
+    )
+
+def load_corpus() -> dict:
+    # log.md, the prompt templates (their examples are responses) and any cached LLM responses
+    corpus = {}
+    for path in [os.path.join(root_dir, 'log.md')] + sorted(glob.glob(os.path.join(root_dir, 'prompts', '*.md'))):
+        with open(path, 'r', encoding='utf-8') as file:
+            corpus[os.path.relpath(path, root_dir)] = file.read()
+    for path in sorted(glob.glob(os.path.join(root_dir, 'llm_cache', '*.json'))):
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                corpus[os.path.relpath(path, root_dir)] = json.load(file)['response']
+        except (OSError, ValueError, KeyError):
+            continue
+    return corpus
+
+def best_time(function, text: str, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_benchmark(repeat: int = 5, scales=(1, 4, 16, 64)) -> bool:
+    corpus = load_corpus()
+    mismatches = [name for name, text in corpus.items() if legacy_all(text) != indexed_all(text)]
+    for name in mismatches:
+        print(f"Extractor mismatch: {name}")
+
+    text = '\n'.join(corpus.values())
+    print(f"Corpus: {len(corpus)} documents, {len(text)} chars\n")
+    print(f"{'Scale':>6}{'Chars':>12}{'Legacy (ms)':>14}{'Index (ms)':>13}{'Index ns/char':>15}")
+    per_char = []
+    for scale in scales:
+        # a long reasoning-model answer: the same sections repeated many times over
+        scaled = '\n'.join([text] * scale)
+        legacy = best_time(legacy_all, scaled, repeat)
+        indexed = best_time(indexed_all, scaled, repeat)
+        per_char.append(indexed / len(scaled))
+        print(f"{scale:>6}{len(scaled):>12}{legacy * 1000:>14.2f}{indexed * 1000:>13.2f}{indexed / len(scaled) * 1e9:>15.1f}")
+
+    # linear parse: cost per character must not grow with the length of the text
+    linear = per_char[-1] < 2 * per_char[0]
+    print(f"\nLinear parse cost: {'OK' if linear else 'FAILED'}")
+    print(f"Extractors agree: {'OK' if not mismatches else 'FAILED'}")
+    return linear and not mismatches
+
+if __name__ == '__main__':
+    sys.exit(0 if run_benchmark() else 1)
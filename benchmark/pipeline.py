@@ -0,0 +1,138 @@
+import sys
+import os
+import time
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+root_dir = str(Path(__file__).parent.parent)
+sys.path.append(root_dir)
+sys.path.append(str(Path(__file__).parent))
+
+import CXMT_Circuit
+from basic import model_store
+from basic.LLM_Interface import LLM_PROVIDER, response_cache
+from basic.scheduler import DAG_SCHEDULER
+from basic.testbench_runner import run_model_tests, summarize_results
+from basic.trace import tracer, print_summary
+from llm_stub import LLM_STUB
+
+class STUB_PROVIDER(LLM_PROVIDER):
+    name = 'stub-model'
+    provider = 'stub'
+    key_env = 'STUB_KEY'
+    base_url = None
+    context_window = 65536
+    stream_usage = True
+    # the stub is local, only the orchestration should limit throughput
+    requests_per_minute = None
+    tokens_per_minute = None
+
+def use_stub(stub: LLM_STUB):
+    os.environ.setdefault(STUB_PROVIDER.key_env, 'stub')
+    STUB_PROVIDER.base_url = stub.url
+    STUB_PROVIDER.client = None
+    CXMT_Circuit.LLM_model = STUB_PROVIDER
+    # every run has to reach the stub, not the local answer cache
+    response_cache.enabled = False
+
+def fresh_store(work_dir: str, top_models: list) -> dict:
+    # a new store seeded from model_json, with the top models reset to their descriptions
+    store = model_store.MODEL_STORE(os.path.join(work_dir, f'model_store_{time.time_ns()}.db'))
+    store.import_json_dir(os.path.join(root_dir, 'model_json'))
+    model_store._default_store = store
+    CXMT_Circuit._all_models = None
+    all_models = CXMT_Circuit.get_all_models()
+    for name in top_models:
+        model = all_models[name]
+        for field in CXMT_Circuit.generated_fields:
+            setattr(model, field, None)
+    return all_models
+
+def run_pipeline(top_models: list, concurrency: int, max_depth: int, simulate: bool, timeout: float) -> dict:
+    all_models = CXMT_Circuit.get_all_models()
+    scheduler = DAG_SCHEDULER(concurrency)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for name in top_models:
+            CXMT_Circuit.build_generation_dag(scheduler, all_models[name], 0, max_depth)
+        states = scheduler.run()
+    generation_time = time.perf_counter() - start
+
+    built = [task.split(':', 1)[1] for task, state in states.items() if task.startswith('test:') and state == 'done']
+    results = []
+    simulation_time = 0.0
+    if simulate:
+        start = time.perf_counter()
+        results = run_model_tests([all_models[name] for name in built], timeout=timeout, max_workers=concurrency)
+        simulation_time = time.perf_counter() - start
+
+    return {
+        'states': states,
+        'built': built,
+        'errors': dict(scheduler.errors),
+        'generation_time': generation_time,
+        'simulation_time': simulation_time,
+        'results': results,
+    }
+
+def run_benchmark(top_models: list, repeat: int = 3, concurrency: int = 4, max_depth: int = 1,
+                  simulate: bool = True, timeout: float = 120, trace_path: str = None, **stub_options) -> bool:
+    with LLM_STUB(**stub_options) as stub, tempfile.TemporaryDirectory() as work_dir:
+        use_stub(stub)
+        tracer.clear()
+        if trace_path:
+            tracer.export(trace_path)
+
+        print(f"Stub at {stub.url} with {len(stub.recordings)} recordings, "
+              f"latency {stub.latency}s, chunk {stub.chunk_size} chars / {stub.chunk_interval}s\n")
+        print(f"{'Run':>4}{'Modules':>9}{'Failed':>8}{'LLM calls':>11}{'Generate (s)':>14}"
+              f"{'Simulate (s)':>14}{'Modules/s':>11}{'Calls/s':>9}")
+        all_ok = True
+        for run in range(repeat):
+            fresh_store(work_dir, top_models)
+            calls_before = stub.requests
+            outcome = run_pipeline(top_models, concurrency, max_depth, simulate, timeout)
+            calls = stub.requests - calls_before
+            failed = sum(state != 'done' for state in outcome['states'].values())
+            generation_time = outcome['generation_time']
+            print(f"{run + 1:>4}{len(outcome['built']):>9}{failed:>8}{calls:>11}{generation_time:>14.2f}"
+                  f"{outcome['simulation_time']:>14.2f}{len(outcome['built']) / generation_time:>11.2f}"
+                  f"{calls / generation_time:>9.2f}")
+            # a built model has to come out of its stages with a netlist
+            all_models = CXMT_Circuit.get_all_models()
+            missing = [name for name in outcome['built'] if all_models[name].netlist is None]
+            all_ok = all_ok and failed == 0 and not missing
+            for task, error in outcome['errors'].items():
+                print(f"      {task}: {error}")
+            for name in missing:
+                print(f"      {name}: built without a netlist")
+
+        if simulate:
+            print(f"\nTest items of the last run: {summarize_results(outcome['results'])}")
+        print(f"Stub replies: {stub.hits} recorded, {stub.misses} synthesized\n")
+        print_summary(list(tracer.spans))
+        if trace_path:
+            tracer.close()
+    return all_ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end pipeline benchmark against the local LLM stub')
+    parser.add_argument('models', nargs='*', default=['ClockDataRecovery', 'TwoStageDifferentialOpamp'])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--max-depth', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.2, help='stub seconds before the first token')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--chunk-interval', type=float, default=0.0)
+    parser.add_argument('--no-simulate', action='store_true', help='skip running the generated test items')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds per test item')
+    parser.add_argument('--trace', default=None, help='also write the spans to this JSONL file')
+    args = parser.parse_args()
+
+    ok = run_benchmark(args.models, repeat=args.repeat, concurrency=args.concurrency, max_depth=args.max_depth,
+                       simulate=not args.no_simulate, timeout=args.timeout, trace_path=args.trace,
+                       latency=args.latency, jitter=args.jitter, chunk_size=args.chunk_size,
+                       chunk_interval=args.chunk_interval)
+    sys.exit(0 if ok else 1)
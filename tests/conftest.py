@@ -0,0 +1,8 @@
+import os
+import sys
+from pathlib import Path
+
+root_dir = str(Path(__file__).parent.parent)
+sys.path.insert(0, root_dir)
+# the stage prompts and model_json are read relative to the repository root
+os.chdir(root_dir)
@@ -0,0 +1,19 @@
+from basic.circuit_model import CIRCUIT_MODEL
+from basic.fingerprint import stage_fingerprint
+from basic.LLM_Interface import KIMI, DeepSeek_R1
+
+prompt_path = './prompts/circuit_generate.md'
+
+def make_model():
+    return CIRCUIT_MODEL(model_name='FingerprintStage', model_description='a stage', inputnode='Vin',
+                         outputnode='Vout')
+
+def test_racing_providers_are_part_of_the_fingerprint():
+    model = make_model()
+    single = stage_fingerprint(model, prompt_path, DeepSeek_R1)
+    raced = stage_fingerprint(model, prompt_path, DeepSeek_R1, [DeepSeek_R1, KIMI])
+
+    assert stage_fingerprint(model, prompt_path, DeepSeek_R1, None) == single
+    assert raced != single
+    assert stage_fingerprint(model, prompt_path, DeepSeek_R1, [KIMI, DeepSeek_R1]) == raced
+    assert stage_fingerprint(model, prompt_path, DeepSeek_R1, [DeepSeek_R1]) != raced
@@ -0,0 +1,27 @@
+from basic import LLM_Interface
+from basic.LLM_Interface import LLM_PROVIDER, get_http_client
+
+
+class LOCAL_PROVIDER(LLM_PROVIDER):
+    name = 'local-model'
+    provider = 'local'
+    key_env = 'LOCAL_TEST_KEY'
+    base_url = 'http://127.0.0.1:9/v1'
+
+
+def test_provider_clients_share_the_http_pool(monkeypatch):
+    monkeypatch.setenv(LOCAL_PROVIDER.key_env, 'local')
+    monkeypatch.setattr(LOCAL_PROVIDER, 'client', None)
+    http_client = get_http_client()
+    assert http_client is not None
+    assert LOCAL_PROVIDER.get_client()._client is http_client
+
+
+def test_missing_http_backend_falls_back_to_the_sdk_default(monkeypatch):
+    monkeypatch.setattr(LLM_Interface, 'http_backends', (('no_such_http_module', 'DefaultHttpxClient'),))
+    monkeypatch.setattr(LLM_Interface, '_http_client', None)
+    monkeypatch.setattr(LLM_Interface, '_http_client_ready', False)
+    monkeypatch.setenv(LOCAL_PROVIDER.key_env, 'local')
+    monkeypatch.setattr(LOCAL_PROVIDER, 'client', None)
+    assert get_http_client() is None
+    assert LOCAL_PROVIDER.get_client() is not None
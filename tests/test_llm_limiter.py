@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+from basic.LLM_Interface import LLM_PROVIDER
+from basic.token_budget import TOKEN_COUNTER
+
+class RECORDING_LIMITER:
+    def __init__(self):
+        self.acquired = []
+        self.settled = []
+
+    def acquire(self, estimated_tokens, cancel=None):
+        self.acquired.append(estimated_tokens)
+        return True
+
+    def settle(self, estimated_tokens, used_tokens):
+        self.settled.append(estimated_tokens)
+
+
+def completion(text, prompt_tokens, stream=False):
+    usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=5)
+    if not stream:
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))], usage=usage)
+    return iter([
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None),
+        SimpleNamespace(choices=[], usage=usage),
+    ])
+
+def make_provider(prompt_tokens):
+    class FAKE_CLIENT:
+        class chat:
+            class completions:
+                @staticmethod
+                def create(stream=False, **kwargs):
+                    return completion('answer', prompt_tokens, stream)
+
+    class PROVIDER(LLM_PROVIDER):
+        name = 'fake-model'
+        provider = 'fake'
+        client = FAKE_CLIENT
+        limiter = RECORDING_LIMITER()
+        counter = TOKEN_COUNTER()
+        stream_usage = True
+    return PROVIDER
+
+
+def test_settles_the_estimate_it_acquired():
+    # the provider reports far more prompt tokens than estimated, which recalibrates the counter
+    provider = make_provider(prompt_tokens=5000)
+    request = 'Design a two stage opamp. ' * 20
+    provider.get_answer(request, use_cache=False)
+    ''.join(provider.get_answer_stream(request, use_cache=False))
+
+    assert provider.limiter.settled == provider.limiter.acquired
+    assert provider.estimate_tokens(request) != provider.limiter.acquired[0]
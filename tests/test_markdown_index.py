@@ -0,0 +1,22 @@
+from basic.markdown_index import MARKDOWN_INDEX
+
+def test_code_block_needs_a_level_three_heading():
+    level_two = "## NetList Code\n```python\nlevel_two = True\n```\n"
+    level_three = "### NetList Code\n```python\nlevel_three = True\n```\n"
+    level_four = "#### NetList Code\n\n```python\nlevel_four = True\n```\n"
+
+    assert MARKDOWN_INDEX(level_two).code_block('NetList Code', 'python') is None
+    assert MARKDOWN_INDEX(level_three).code_block('NetList Code', 'python') == 'level_three = True'
+    assert MARKDOWN_INDEX(level_four).code_block('NetList Code', 'python') == 'level_four = True'
+    assert MARKDOWN_INDEX(level_two + level_three).code_block('NetList Code', 'python') == 'level_three = True'
+
+
+def test_topology_accepts_a_level_two_heading():
+    # the "## Topology" section prompts/submodule_connect.md asks for
+    from benchmark.llm_stub import submodule_connect_response
+    import CXMT_Circuit
+
+    response = submodule_connect_response("topology = True")
+    assert CXMT_Circuit.extract_code(response, 'Topology', 'python', min_level=2) == 'topology = True'
+    assert CXMT_Circuit.stage_checks['Submodule_Connect'](response)
+    assert MARKDOWN_INDEX(response).code_block('Topology', 'python') is None
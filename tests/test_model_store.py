@@ -0,0 +1,23 @@
+from basic.circuit_model import CIRCUIT_MODEL
+from basic.model_store import MODEL_STORE
+
+
+def test_partial_assignment_is_saved(tmp_path):
+    store = MODEL_STORE(str(tmp_path / 'models.db'))
+    store.save(CIRCUIT_MODEL(model_name='A', netlist='old', testcode=['test_old']))
+
+    model = store.get('A')
+    model.netlist = 'new'
+    store.save(model)
+    assert store.get('A').netlist == 'new'
+    assert store.get('A').testcode == ['test_old']
+
+    model = store.get('A')
+    model.testcode = ['test_new']
+    store.save(model)
+    saved = store.get('A')
+    assert (saved.netlist, saved.testcode) == ('new', ['test_new'])
+
+    # a model that was only read back writes no large fields at all
+    store.save(store.get('A'))
+    assert store.get('A').netlist == 'new'
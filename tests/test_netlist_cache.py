@@ -0,0 +1,19 @@
+from basic.netlist_cache import NETLIST_CACHE
+
+
+class COUNTER:
+    NAME = 'counter'
+    NODES = ('a', 'b')
+
+    def __init__(self, n=1):
+        self.n = n
+
+    def __str__(self):
+        return f".subckt counter a b n={self.n}\n.ends counter"
+
+
+def test_int_and_float_arguments_get_their_own_fragment():
+    cache = NETLIST_CACHE()
+    assert str(cache.get(COUNTER, n=2)) != str(cache.get(COUNTER, n=2.0))
+    assert cache.get(COUNTER, n=1e-6) is cache.get(COUNTER, n=0.000001)
+    assert cache.stats() == {'hits': 1, 'misses': 3, 'size': 3}
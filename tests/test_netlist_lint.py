@@ -0,0 +1,52 @@
+import sys
+import time
+
+from basic import fork_server
+from basic.fork_server import FORK_SERVER
+from basic.netlist_lint import lint_code, lint_code_isolated, has_errors
+
+good_netlist = """
+from PySpice.Spice.Netlist import SubCircuitFactory
+
+class DIVIDER(SubCircuitFactory):
+    NAME = 'divider'
+    NODES = ('vin', 'out', 'gnd')
+
+    def __init__(self):
+        super().__init__()
+        self.R(1, 'vin', 'out', 1e3)
+        self.R(2, 'out', 'gnd', 1e3)
+"""
+
+
+def test_exit_in_generated_code_is_a_load_error():
+    saved_path = sys.path[:]
+    issues = lint_code("import sys\nsys.path.append('/nowhere')\nsys.exit(3)\n")
+    assert [issue.check for issue in issues] == ['load_error']
+    assert 'SystemExit' in issues[0].message
+    assert sys.path == saved_path
+
+
+def test_isolated_lint_reports_issues():
+    assert not has_errors(lint_code_isolated(good_netlist, timeout=30))
+    issues = lint_code_isolated("import sys\nsys.exit(0)\n", timeout=30)
+    assert [issue.check for issue in issues] == ['load_error']
+
+
+def test_isolated_lint_has_no_provider_keys(monkeypatch):
+    monkeypatch.setenv('CXMT_TEST_API_KEY', 'secret')
+    code = "import os\nassert 'CXMT_TEST_API_KEY' not in os.environ, 'key leaked'\n" + good_netlist
+    with FORK_SERVER() as server:
+        monkeypatch.setattr(fork_server, 'get_fork_server', lambda: server)
+        assert not has_errors(lint_code_isolated(code, timeout=30))
+    # and in the fresh interpreter used where there is no fork
+    monkeypatch.setattr(FORK_SERVER, 'available', staticmethod(lambda: False))
+    assert not has_errors(lint_code_isolated(code, timeout=60))
+
+
+def test_isolated_lint_times_out():
+    start = time.perf_counter()
+    issues = lint_code_isolated("while True:\n    pass\n", timeout=2)
+    assert time.perf_counter() - start < 15
+    assert [issue.check for issue in issues] == ['load_error']
+    assert 'did not finish' in issues[0].message
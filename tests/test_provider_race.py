@@ -0,0 +1,88 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import openai
+
+import basic.LLM_Interface as LLM_Interface
+from basic.LLM_Interface import LLM_PROVIDER
+from basic.provider_race import RACE_STATS, race
+from basic.token_budget import TOKEN_COUNTER
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))], usage=None)
+
+
+class BLOCKED_STREAM:
+    # never sends a first token, close() is the only way out
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        self.closed.wait(30)
+        raise RuntimeError("stream closed")
+
+    def close(self):
+        self.closed.set()
+
+
+def make_provider(name, create):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return type(name, (LLM_PROVIDER,), {
+        'name': name, 'provider': name, 'client': client, 'counter': TOKEN_COUNTER(),
+        'requests_per_minute': None, 'tokens_per_minute': None, 'max_retries': 20,
+    })
+
+
+def test_winner_cancels_streams_and_backoffs(monkeypatch):
+    monkeypatch.setattr(LLM_Interface, 'backoff_delay', lambda attempt, server_delay=None: 30.0)
+    blocked = BLOCKED_STREAM()
+    attempts = []
+    finished = {}
+
+    def failing(**kwargs):
+        attempts.append(time.perf_counter())
+        raise openai.APIConnectionError(request=None)
+
+    def fast(**kwargs):
+        time.sleep(0.2)
+        return iter([chunk('### NetList Code\n'), chunk('ok')])
+
+    providers = [
+        make_provider('fast-model', fast),
+        make_provider('blocked-model', lambda **kwargs: blocked),
+        make_provider('backoff-model', failing),
+    ]
+    monkeypatch.setattr(LLM_Interface.response_cache, 'enabled', False)
+    for provider in providers:
+        # notes when each racer's request has really ended
+        def stream(cls, request, stage=None, cancel=None, _original=provider.get_answer_stream.__func__):
+            try:
+                yield from _original(cls, request, stage=stage, cancel=cancel)
+            finally:
+                finished[cls.name] = time.perf_counter()
+        monkeypatch.setattr(provider, 'get_answer_stream', classmethod(stream))
+
+    stats = RACE_STATS()
+
+    response, winner = race(providers, 'prompt', lambda text: text.endswith('ok'), stage='Generate_Circuit',
+                            stats=stats)
+    won = time.perf_counter()
+    assert winner.name == 'fast-model'
+    assert response == '### NetList Code\nok'
+
+    deadline = time.time() + 5
+    while len(finished) < 3 and time.time() < deadline:
+        time.sleep(0.02)
+    # the stream without a first token is closed and the retry backoff is cut short
+    assert blocked.closed.is_set()
+    assert finished['blocked-model'] - won < 1.0
+    assert finished['backoff-model'] - won < 1.0
+    assert len(attempts) == 1
+
+    deadline = time.time() + 5
+    while stats.summary()['backoff-model']['cancelled'] + stats.summary()['blocked-model']['cancelled'] < 2 \
+            and time.time() < deadline:
+        time.sleep(0.02)
+    assert stats.summary()['blocked-model']['cancelled'] == 1
+    assert stats.summary()['backoff-model']['cancelled'] == 1
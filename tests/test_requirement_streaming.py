@@ -0,0 +1,64 @@
+import CXMT_Circuit
+from basic.circuit_model import CIRCUIT_MODEL
+
+response = """## Requirement Parsing
+
+#### Module 1
+Model: StreamStageA
+Description: first stage
+Input Nodes: Vin, VDD, GND
+Output Nodes: Vmid
+
+#### Module 2
+Model: StreamStageB
+Description: second stage
+Input Nodes: Vmid, VDD, GND
+Output Nodes: Vout
+"""
+
+class STREAM_PROVIDER:
+    name = 'stream-stub'
+    context_window = 65536
+
+    @classmethod
+    def get_counter(cls):
+        from basic.token_budget import TOKEN_COUNTER
+        return TOKEN_COUNTER()
+
+    @classmethod
+    def prompt_budget(cls):
+        return cls.context_window
+
+    @classmethod
+    def get_answer_stream(cls, request, stage=None):
+        for start in range(0, len(response), 7):
+            yield response[start:start + 7]
+
+
+def test_streaming_dispatches_every_module(monkeypatch):
+    generated = []
+    monkeypatch.setattr(CXMT_Circuit, 'LLM_model', STREAM_PROVIDER)
+    monkeypatch.setattr(CXMT_Circuit, 'racing_providers', None)
+    monkeypatch.setattr(CXMT_Circuit, '_all_models', {})
+    monkeypatch.setattr(CXMT_Circuit, 'create_sub_circuit', lambda model: generated.append(model.model_name))
+
+    topmodel = CIRCUIT_MODEL(model_name='StreamTop', model_description='two stages',
+                             inputnode='Vin', outputnode='Vout', parameter='')
+    failed = CXMT_Circuit.create_requirement_parsing_streaming(topmodel, concurrency=2)
+
+    assert failed == {}
+    assert topmodel.submodel_names == ['StreamStageA', 'StreamStageB']
+    assert sorted(generated) == ['StreamStageA', 'StreamStageB']
+    assert set(CXMT_Circuit.get_all_models()) == {'StreamStageA', 'StreamStageB'}
+
+
+def test_stage_prompt_reports_unused_fields_once(monkeypatch, capsys):
+    monkeypatch.setattr(CXMT_Circuit, 'LLM_model', STREAM_PROVIDER)
+    monkeypatch.setattr(CXMT_Circuit, '_reported_unused', set())
+    model = CIRCUIT_MODEL(model_name='StreamTop', model_description='two stages', inputnode='Vin',
+                          outputnode='Vout', netlist='class StreamTop: pass')
+    for _ in range(2):
+        CXMT_Circuit.generate_stage_prompt('Requirement_Parsing', model.get_replacement())
+
+    warnings = [line for line in capsys.readouterr().out.splitlines() if 'does not use' in line]
+    assert warnings == ["Warning: ./prompts/requirement_parsing.md does not use ModelCode"]
@@ -0,0 +1,20 @@
+import os
+
+from basic.LLM_Interface import LLM_CACHE
+
+
+class VANISHED_ENTRY:
+    # a directory entry whose file another process removed after the scan
+    name = 'gone.json'
+    path = 'gone.json'
+
+    def stat(self):
+        raise FileNotFoundError(self.path)
+
+
+def test_put_survives_a_concurrently_evicted_entry(monkeypatch, tmp_path):
+    cache = LLM_CACHE(str(tmp_path), max_bytes=1)
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: [VANISHED_ENTRY()] + list(scandir(path)))
+    cache.put('key', 'response')
+    assert not os.path.exists(os.path.join(str(tmp_path), 'key.json'))
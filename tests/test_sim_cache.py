@@ -0,0 +1,22 @@
+import os
+
+import numpy as np
+
+from basic.sim_cache import SIM_CACHE
+
+
+class VANISHED_ENTRY:
+    # a directory entry whose file another process removed after the scan
+    name = 'gone.npz'
+    path = 'gone.npz'
+
+    def stat(self):
+        raise FileNotFoundError(self.path)
+
+
+def test_put_survives_a_concurrently_evicted_entry(monkeypatch, tmp_path):
+    cache = SIM_CACHE(str(tmp_path), max_bytes=1)
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: [VANISHED_ENTRY()] + list(scandir(path)))
+    cache.put('key', 'op1', [('vout', 1, np.array([1.0]))])
+    assert not os.path.exists(os.path.join(str(tmp_path), 'key.npz'))
@@ -0,0 +1,76 @@
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from basic import param_sweep
+from basic.spice_pool import SPICE_POOL, SimulationError
+from basic.sim_watchdog import SimulationFailure
+
+
+class STUB_MODULE:
+    def __init__(self, index):
+        self.index = index
+
+
+def stub_deck(deck: str, time_budget: float = None) -> dict:
+    # stands in for run_deck in the workers, deck 'hang' behaves like an
+    # analysis whose ngspice thread did not stop after the watchdog halted it
+    if deck == 'hang':
+        time.sleep(0.1)
+        threading.Thread(target=threading.Event().wait).start()
+        raise SimulationFailure('timeout', 'analysis exceeded its 0.1s budget', halted=False)
+    if deck == 'forever':
+        # a hang the watchdog does not see
+        threading.Event().wait()
+    if deck == 'fail':
+        raise SimulationFailure('non_convergence', 'timestep too small', halted=True)
+    # still running on the other worker when the hung one goes down
+    time.sleep(0.3)
+    return {'vout': np.array([float(deck)])}
+
+
+def test_hung_sample_does_not_fail_the_others(monkeypatch, tmp_path):
+    monkeypatch.setattr(param_sweep, 'run_deck', stub_deck)
+    monkeypatch.setattr(param_sweep, 'render_deck', lambda circuit, analysis, **params: circuit)
+    samples = [{'index': i} for i in range(12)]
+
+    def testbench(module):
+        return 'hang' if module.index == 3 else str(module.index)
+
+    pool = SPICE_POOL(n_workers=2)
+    pool.initializer = None
+    with pool:
+        param_sweep.run_sweep(STUB_MODULE, samples, testbench, 'operating_point', {}, ['vout'],
+                              str(tmp_path), pool=pool, use_cache=False)
+    sweep = param_sweep.load_sweep(str(tmp_path))
+
+    assert list(sweep['ok']) == [i != 3 for i in range(12)]
+    assert sweep['error'][3] == 'timeout: analysis exceeded its 0.1s budget'
+    ok = sweep['ok']
+    assert np.allclose(sweep['out:vout'][ok, 0], sweep['param:index'][ok])
+
+
+def test_simulation_failure_comes_back_from_the_pool():
+    pool = SPICE_POOL(n_workers=1)
+    pool.initializer = None
+    with pool:
+        with pytest.raises(SimulationFailure) as failure:
+            pool.run_job(stub_deck, 'fail')
+        assert pool.run_job(stub_deck, '2.0')['vout'][0] == 2.0
+    assert failure.value.kind == 'non_convergence'
+
+
+def test_job_past_its_deadline_is_killed():
+    pool = SPICE_POOL(n_workers=1, time_budget=0.5)
+    pool.initializer = None
+    pool.job_grace = 0.5
+    with pool:
+        start = time.perf_counter()
+        with pytest.raises(SimulationFailure) as failure:
+            pool.run_job(stub_deck, 'forever')
+        assert time.perf_counter() - start < 10
+        # the worker is still there for the next job
+        assert pool.run_job(stub_deck, '1.0')['vout'][0] == 1.0
+    assert failure.value.kind == 'timeout'